@@ -1,5 +1,6 @@
 from app.api.dependencies.auth import (
     get_current_user,
+    get_current_principal,
     get_current_active_user,
     get_current_active_admin,
     get_current_active_staff
@@ -7,7 +8,9 @@ from app.api.dependencies.auth import (
 from app.api.dependencies.pagination import (
     PaginationParams,
     PaginatedResponse,
-    get_pagination_params
+    CursorParams,
+    get_pagination_params,
+    get_cursor_params
 )
 from app.api.dependencies.search import (
     SearchParams,
@@ -16,12 +19,15 @@ from app.api.dependencies.search import (
 
 __all__ = [
     "get_current_user",
+    "get_current_principal",
     "get_current_active_user",
     "get_current_active_admin",
     "get_current_active_staff",
     "PaginationParams",
     "PaginatedResponse",
+    "CursorParams",
     "get_pagination_params",
+    "get_cursor_params",
     "SearchParams",
     "get_search_params"
 ]
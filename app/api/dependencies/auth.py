@@ -3,25 +3,24 @@ from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.cache import principal_cache
 from app.core.config import settings
 from app.core.security import decode_token
 from app.db.base import get_db
 from app.db.models.user import User
-from app.schemas import TokenPayload
+from app.schemas import Principal, TokenPayload
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_PREFIX}/auth/login")
 
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
 
-async def get_current_user(
-    db: AsyncSession = Depends(get_db),
-    token: str = Depends(oauth2_scheme)
-) -> User:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+
+def get_token_data(token: str = Depends(oauth2_scheme)) -> TokenPayload:
     try:
         payload = decode_token(token)
         token_data = TokenPayload(**payload)
@@ -29,26 +28,57 @@ async def get_current_user(
             raise credentials_exception
     except JWTError:
         raise credentials_exception
+    return token_data
+
 
+async def get_current_user(
+    db: AsyncSession = Depends(get_db),
+    token_data: TokenPayload = Depends(get_token_data)
+) -> User:
     user = await db.get(User, int(token_data.sub))
     if user is None:
         raise credentials_exception
+    await principal_cache.set(user.id, Principal.from_orm(user))
     if not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return user
 
 
+async def get_current_principal(
+    db: AsyncSession = Depends(get_db),
+    token_data: TokenPayload = Depends(get_token_data)
+) -> Principal:
+    """
+    Same checks as get_current_user, but served from the principal cache, so
+    most requests don't need a database round trip to authorize.
+    """
+    user_id = int(token_data.sub)
+    cached = await principal_cache.get(user_id)
+    if cached is not None:
+        principal = Principal(**cached)
+    else:
+        user = await db.get(User, user_id)
+        if user is None:
+            raise credentials_exception
+        principal = Principal.from_orm(user)
+        await principal_cache.set(user_id, principal)
+
+    if not principal.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return principal
+
+
 async def get_current_active_user(
-    current_user: User = Depends(get_current_user),
-) -> User:
+    current_user: Principal = Depends(get_current_principal),
+) -> Principal:
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
 
 async def get_current_active_admin(
-    current_user: User = Depends(get_current_user),
-) -> User:
+    current_user: Principal = Depends(get_current_principal),
+) -> Principal:
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     if current_user.role != "admin":
@@ -60,8 +90,8 @@ async def get_current_active_admin(
 
 
 async def get_current_active_staff(
-    current_user: User = Depends(get_current_user),
-) -> User:
+    current_user: Principal = Depends(get_current_principal),
+) -> Principal:
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     if current_user.role not in ["admin", "staff"]:
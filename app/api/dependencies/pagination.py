@@ -1,17 +1,28 @@
+from typing import Generic, List, Optional, TypeVar
+from fastapi import Query
 from pydantic import BaseModel, Field
 
 
+T = TypeVar("T")
+
+
 class PaginationParams(BaseModel):
     page: int = Field(1, ge=1)
     size: int = Field(10, ge=1, le=100)
 
 
-class PaginatedResponse(BaseModel):
-    items: list
-    total: int
-    page: int
+class CursorParams(BaseModel):
+    cursor: Optional[str] = None
+    limit: int = Field(100, ge=1, le=100)
+
+
+class PaginatedResponse(BaseModel, Generic[T]):
+    items: List[T]
+    total: Optional[int] = None
+    page: Optional[int] = None
     size: int
-    pages: int
+    pages: Optional[int] = None
+    next_cursor: Optional[str] = None
 
 
 def get_pagination_params(
@@ -19,3 +30,10 @@ def get_pagination_params(
     size: int = 10
 ) -> PaginationParams:
     return PaginationParams(page=page, size=size)
+
+
+def get_cursor_params(
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=100)
+) -> CursorParams:
+    return CursorParams(cursor=cursor, limit=limit)
@@ -2,9 +2,11 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.api.dependencies import get_current_active_staff
+from app.core.security import password_hasher, token_cache
 from app.db.base import get_db
 from app.services.auth import AuthService
-from app.schemas import Token, UserCreate, UserVerify
+from app.schemas import Principal, Token, UserCreate, UserVerify
 
 router = APIRouter()
 
@@ -84,3 +86,13 @@ async def refresh_token(
             detail=str(e),
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+
+@router.get("/stats", response_model=dict)
+async def get_auth_stats(
+    current_user: Principal = Depends(get_current_active_staff)
+):
+    """
+    Get this worker's password hashing queue depth and verified token cache hit rate (only for staff).
+    """
+    return {"password_hasher": password_hasher.stats(), "token_cache": token_cache.stats()}
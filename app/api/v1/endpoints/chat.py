@@ -1,19 +1,25 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Dict, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.base import get_db
-from app.db.models.user import User
-from app.api.dependencies import get_current_active_user, get_current_active_staff
+from app.api.dependencies import (
+    get_current_active_user,
+    get_current_active_staff,
+    CursorParams,
+    PaginatedResponse,
+    get_cursor_params
+)
 from app.services.chat import ChatService
-from app.schemas import ChatSession, ChatMessage, ChatMessageCreate
+from app.websockets.chat import manager, read_frame
+from app.schemas import Principal, ChatHistory, ChatSession, ChatSessionOverview, ChatMessage, ChatMessageCreate
 
 router = APIRouter()
 
 
 @router.get("/session", response_model=ChatSession)
 async def get_chat_session(
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -25,7 +31,7 @@ async def get_chat_session(
 @router.post("/messages", response_model=ChatMessage)
 async def add_message(
     message: ChatMessageCreate,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -34,17 +40,8 @@ async def add_message(
     chat_service = ChatService(db)
     return await chat_service.add_message(current_user.id, message.content)
 
-@router.get("/messages/{session_id}", response_model=List[ChatMessage])
-async def get_messages(
-    session_id: int,
-    skip: int = 0,
-    limit: int = 100,
-    current_user: User = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_db)
-):
-    """
-    Get the messages of the chat session.
-    """
+async def check_session_access(db: AsyncSession, session_id: int, current_user: Principal) -> None:
+    """Raises unless the chat session exists and belongs to the user, or the user is staff"""
     from app.crud import chat_session
 
     session = await chat_session.get(db, id=session_id)
@@ -60,40 +57,94 @@ async def get_messages(
             detail="No access to this chat session"
         )
 
-    chat_service = ChatService(db)
-    return await chat_service.get_messages(session_id, skip=skip, limit=limit)
+@router.get("/messages/{session_id}", response_model=ChatHistory)
+async def get_messages(
+    session_id: int,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=100),
+    current_user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get the messages of the chat session, newest first. Pass the returned
+    `before` cursor to scroll back, or `after` to fetch newer messages.
+    """
+    await check_session_access(db, session_id, current_user)
+
+    try:
+        chat_service = ChatService(db)
+        return await chat_service.get_messages(
+            session_id,
+            before=before,
+            after=after,
+            limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
 
 @router.post("/messages/{session_id}/read", response_model=dict)
 async def mark_messages_as_read(
     session_id: int,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Mark messages as read.
     """
+    await check_session_access(db, session_id, current_user)
+
     chat_service = ChatService(db)
-    await chat_service.mark_messages_as_read(session_id, current_user.id)
-    return {"message": "Messages marked as read"}
+    message_ids = await chat_service.mark_messages_as_read(session_id, current_user.id)
+    if message_ids:
+        await manager.broadcast(read_frame(session_id, current_user.id, message_ids), session_id)
+    return {"message": "Messages marked as read", "message_ids": message_ids}
 
-@router.get("/sessions/active", response_model=List[ChatSession])
-async def get_active_sessions(
-    skip: int = 0,
-    limit: int = 100,
-    current_user: User = Depends(get_current_active_staff),
+@router.get("/sessions/unread", response_model=Dict[int, int])
+async def get_unread_counts(
+    session_ids: List[int] = Query(..., max_length=500),
+    current_user: Principal = Depends(get_current_active_staff),
     db: AsyncSession = Depends(get_db)
 ):
     """
-    Get the list of active chat sessions (only for staff).
+    Get the number of unread messages in each of the chat sessions (only for staff).
     """
     chat_service = ChatService(db)
-    return await chat_service.get_active_sessions(skip=skip, limit=limit)
+    return await chat_service.get_unread_counts(session_ids, current_user.id)
+
+@router.get("/sessions/active", response_model=PaginatedResponse[ChatSessionOverview])
+async def get_active_sessions(
+    pagination: CursorParams = Depends(get_cursor_params),
+    messages_limit: int = Query(10, ge=0, le=50),
+    current_user: Principal = Depends(get_current_active_staff),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get the list of active chat sessions with their latest messages and unread counts (only for staff).
+    """
+    try:
+        chat_service = ChatService(db)
+        items, next_cursor = await chat_service.get_active_sessions(
+            current_user.id,
+            cursor=pagination.cursor,
+            limit=pagination.limit,
+            messages_limit=messages_limit
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return PaginatedResponse(items=items, size=pagination.limit, next_cursor=next_cursor)
 
 @router.post("/staff/messages/{session_id}", response_model=ChatMessage)
 async def add_staff_message(
     session_id: int,
     message: ChatMessageCreate,
-    current_user: User = Depends(get_current_active_staff),
+    current_user: Principal = Depends(get_current_active_staff),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -115,7 +166,7 @@ async def add_staff_message(
 @router.post("/sessions/{session_id}/close", response_model=dict)
 async def close_session(
     session_id: int,
-    current_user: User = Depends(get_current_active_staff),
+    current_user: Principal = Depends(get_current_active_staff),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -131,3 +182,22 @@ async def close_session(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
+
+@router.get("/sessions/{session_id}/presence", response_model=dict)
+async def get_session_presence(
+    session_id: int,
+    current_user: Principal = Depends(get_current_active_staff)
+):
+    """
+    Get the ids of the users connected to the chat session, as seen by this worker (only for staff).
+    """
+    return {"session_id": session_id, "online_user_ids": manager.presence.online(session_id)}
+
+@router.get("/connections/stats", response_model=dict)
+async def get_connection_stats(
+    current_user: Principal = Depends(get_current_active_staff)
+):
+    """
+    Get this worker's chat connection metrics: queue depth and dropped frames (only for staff).
+    """
+    return manager.stats()
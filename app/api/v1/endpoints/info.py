@@ -1,21 +1,33 @@
-from typing import List, Dict, Optional
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Dict, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.base import get_db
-from app.db.models.user import User
 from app.api.dependencies import get_current_active_staff
 from app.services.info import InfoService
 from app.schemas import (
+    Principal,
     CoffeeShopLocation, CoffeeShopLocationCreate, CoffeeShopLocationUpdate,
     StaticInfo, StaticInfoCreate, StaticInfoUpdate, CompanyInfo
 )
 
 router = APIRouter()
 
+
+def snapshot_response(request: Request, document: Tuple[bytes, str]) -> Response:
+    """Serves a pre-rendered JSON document, honouring If-None-Match"""
+    body, etag = document
+    if_none_match = request.headers.get("if-none-match", "")
+    client_etags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    if etag in client_etags or if_none_match.strip() == "*":
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+
 # Coffee Shop Locations
 @router.get("/locations", response_model=List[CoffeeShopLocation])
 async def read_locations(
+    request: Request,
     city: Optional[str] = None,
     db: AsyncSession = Depends(get_db)
 ):
@@ -23,7 +35,9 @@ async def read_locations(
     Get the list of coffee shop locations, optionally filtering by city.
     """
     info_service = InfoService(db)
-    return await info_service.get_locations(city=city)
+    if city:
+        return await info_service.get_locations(city=city)
+    return snapshot_response(request, await info_service.get_snapshot_document("locations"))
 
 @router.get("/locations/{location_id}", response_model=CoffeeShopLocation)
 async def read_location(
@@ -45,7 +59,7 @@ async def read_location(
 @router.post("/locations", response_model=CoffeeShopLocation, status_code=status.HTTP_201_CREATED)
 async def create_location(
     location_in: CoffeeShopLocationCreate,
-    current_user: User = Depends(get_current_active_staff),
+    current_user: Principal = Depends(get_current_active_staff),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -58,7 +72,7 @@ async def create_location(
 async def update_location(
     location_id: int,
     location_in: CoffeeShopLocationUpdate,
-    current_user: User = Depends(get_current_active_staff),
+    current_user: Principal = Depends(get_current_active_staff),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -93,18 +107,19 @@ async def read_static_info(
 
 @router.get("/static", response_model=Dict[str, str])
 async def read_all_static_info(
+    request: Request,
     db: AsyncSession = Depends(get_db)
 ):
     """
     Get all static information.
     """
     info_service = InfoService(db)
-    return await info_service.get_all_static_info()
+    return snapshot_response(request, await info_service.get_snapshot_document("static"))
 
 @router.post("/static", response_model=StaticInfo, status_code=status.HTTP_201_CREATED)
 async def create_static_info(
     info_in: StaticInfoCreate,
-    current_user: User = Depends(get_current_active_staff),
+    current_user: Principal = Depends(get_current_active_staff),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -123,7 +138,7 @@ async def create_static_info(
 async def update_static_info(
     key: str,
     info_in: StaticInfoUpdate,
-    current_user: User = Depends(get_current_active_staff),
+    current_user: Principal = Depends(get_current_active_staff),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -141,10 +156,11 @@ async def update_static_info(
 # Company Information
 @router.get("/company", response_model=CompanyInfo)
 async def get_company_info(
+    request: Request,
     db: AsyncSession = Depends(get_db)
 ):
     """
     Get general information about the company.
     """
     info_service = InfoService(db)
-    return await info_service.get_company_info()
+    return snapshot_response(request, await info_service.get_snapshot_document("company"))
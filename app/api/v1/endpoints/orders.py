@@ -1,13 +1,19 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status, Body
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Body, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.base import get_db
-from app.db.models.user import User
 from app.db.models.order import OrderStatus
-from app.api.dependencies import get_current_active_user, get_current_active_staff
+from app.api.dependencies import (
+    get_current_active_user,
+    get_current_active_staff,
+    CursorParams,
+    PaginatedResponse,
+    get_cursor_params
+)
 from app.services.order import OrderService
-from app.schemas import Order
+from app.schemas import Principal, Order
 
 router = APIRouter()
 
@@ -15,7 +21,7 @@ router = APIRouter()
 async def create_order(
     delivery_address: str = Body(...),
     contact_phone: str = Body(...),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -34,23 +40,33 @@ async def create_order(
             detail=str(e)
         )
 
-@router.get("/", response_model=List[Order])
+@router.get("/", response_model=PaginatedResponse[Order])
 async def read_user_orders(
-    skip: int = 0,
-    limit: int = 100,
-    current_user: User = Depends(get_current_active_user),
+    pagination: CursorParams = Depends(get_cursor_params),
+    current_user: Principal = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db)
 ):
     """
-    Get the list of orders for the current user.
+    Get the list of orders for the current user, newest first.
     """
-    order_service = OrderService(db)
-    return await order_service.get_orders(current_user.id, skip=skip, limit=limit)
+    try:
+        order_service = OrderService(db)
+        items, next_cursor = await order_service.get_orders(
+            current_user.id,
+            cursor=pagination.cursor,
+            limit=pagination.limit
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return PaginatedResponse(items=items, size=pagination.limit, next_cursor=next_cursor)
 
 @router.get("/{order_id}", response_model=Order)
 async def read_order(
     order_id: int,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -68,7 +84,7 @@ async def read_order(
 @router.put("/{order_id}/cancel", response_model=Order)
 async def cancel_order(
     order_id: int,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -87,7 +103,7 @@ async def cancel_order(
 async def update_order_status(
     order_id: int,
     status: OrderStatus,
-    current_user: User = Depends(get_current_active_staff),
+    current_user: Principal = Depends(get_current_active_staff),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -102,33 +118,30 @@ async def update_order_status(
             detail=str(e)
         )
 
-@router.get("/admin/all", response_model=List[Order])
+@router.get("/admin/all", response_model=PaginatedResponse[Order])
 async def read_all_orders(
-    skip: int = 0,
-    limit: int = 100,
-    status: OrderStatus = None,
-    current_user: User = Depends(get_current_active_staff),
+    order_status: Optional[OrderStatus] = Query(None, alias="status"),
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    pagination: CursorParams = Depends(get_cursor_params),
+    current_user: Principal = Depends(get_current_active_staff),
     db: AsyncSession = Depends(get_db)
 ):
     """
-    Get the list of all orders (only for staff).
+    Get the list of all orders, oldest first (only for staff).
     """
-    from app.crud import order
-
-    if status:
-        db_orders = await order.get_by_status(db, status=status, skip=skip, limit=limit)
-    else:
-        query = None  # Use the default query
-        db_orders = await order.get_multi(db, skip=skip, limit=limit, query=query)
-
-    order_service = OrderService(db)
-    result = []
-
-    for db_order in db_orders:
-        try:
-            order_data = await order_service.get_order(db_order.user_id, db_order.id)
-            result.append(order_data)
-        except ValueError:
-            continue
-
-    return result
+    try:
+        order_service = OrderService(db)
+        items, next_cursor = await order_service.get_all_orders(
+            cursor=pagination.cursor,
+            limit=pagination.limit,
+            status=order_status,
+            created_from=created_from,
+            created_to=created_to
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return PaginatedResponse(items=items, size=pagination.limit, next_cursor=next_cursor)
@@ -1,14 +1,19 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.models.user import User
 from app.db.base import get_db
-from app.api.dependencies import get_current_active_staff
+from app.api.dependencies import (
+    get_current_active_staff,
+    CursorParams,
+    PaginatedResponse,
+    get_cursor_params
+)
 from app.services.product import ProductService
 from app.schemas import (
+    Principal,
     Category, CategoryCreate,
-    Product, ProductCreate, ProductUpdate
+    Product, ProductCreate, ProductUpdate, ProductSuggestion
 )
 
 router = APIRouter()
@@ -45,7 +50,7 @@ async def read_category(
 async def create_category(
     category_in: CategoryCreate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_staff)
+    current_user: Principal = Depends(get_current_active_staff)
 ):
     """
     Create a new category (only for staff).
@@ -54,24 +59,42 @@ async def create_category(
     return await product_service.create_category(category_in)
 
 # Products
-@router.get("/", response_model=List[Product])
+@router.get("/", response_model=PaginatedResponse[Product])
 async def read_products(
-    skip: int = 0,
-    limit: int = 100,
     category_id: Optional[int] = None,
     search: Optional[str] = None,
+    pagination: CursorParams = Depends(get_cursor_params),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Get the list of all products with filtering and search capabilities.
     """
+    try:
+        product_service = ProductService(db)
+        items, next_cursor = await product_service.get_products(
+            cursor=pagination.cursor,
+            limit=pagination.limit,
+            category_id=category_id,
+            search=search
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return PaginatedResponse(items=items, size=pagination.limit, next_cursor=next_cursor)
+
+@router.get("/suggest", response_model=List[ProductSuggestion])
+async def suggest_products(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=20),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get product name suggestions for autocomplete.
+    """
     product_service = ProductService(db)
-    return await product_service.get_products(
-        skip=skip,
-        limit=limit,
-        category_id=category_id,
-        search=search
-    )
+    return await product_service.suggest_products(q, limit=limit)
 
 @router.get("/{product_id}", response_model=Product)
 async def read_product(
@@ -94,7 +117,7 @@ async def read_product(
 async def create_product(
     product_in: ProductCreate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_staff)
+    current_user: Principal = Depends(get_current_active_staff)
 ):
     """
     Create a new product (only for staff).
@@ -113,7 +136,7 @@ async def update_product(
     product_id: int,
     product_in: ProductUpdate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_staff)
+    current_user: Principal = Depends(get_current_active_staff)
 ):
     """
     Update a product (only for staff).
@@ -131,7 +154,7 @@ async def update_product(
 async def delete_product(
     product_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_staff)
+    current_user: Principal = Depends(get_current_active_staff)
 ):
     """
     Delete a product (only for staff).
@@ -3,20 +3,26 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.base import get_db
 from app.db.models.user import User
-from app.api.dependencies import get_current_active_user, get_current_active_admin
-from app.schemas import User as UserSchema, UserUpdate
+from app.api.dependencies import (
+    get_current_user,
+    get_current_active_admin,
+    CursorParams,
+    PaginatedResponse,
+    get_cursor_params
+)
+from app.schemas import Principal, User as UserSchema, UserUpdate
 
 router = APIRouter()
 
 @router.get("/me", response_model=UserSchema)
-async def read_users_me(current_user: User = Depends(get_current_active_user)):
+async def read_users_me(current_user: User = Depends(get_current_user)):
     """
     Get information about the current user.
     """
     return current_user
 
 @router.put("/me", response_model=UserSchema)
-async def update_user_me(user_in: UserUpdate, current_user: User = Depends(get_current_active_user), db: AsyncSession = Depends(get_db)):
+async def update_user_me(user_in: UserUpdate, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     """
     Update the current user's data.
     """
@@ -31,7 +37,7 @@ async def update_user_me(user_in: UserUpdate, current_user: User = Depends(get_c
         )
 
 @router.get("/{user_id}", response_model=UserSchema)
-async def read_user_by_id(user_id: int, current_user: User = Depends(get_current_active_admin), db: AsyncSession = Depends(get_db)):
+async def read_user_by_id(user_id: int, current_user: Principal = Depends(get_current_active_admin), db: AsyncSession = Depends(get_db)):
     """
     Get a user by ID (only for administrators).
     """
@@ -44,12 +50,19 @@ async def read_user_by_id(user_id: int, current_user: User = Depends(get_current
         )
     return user_obj
 
-@router.get("/", response_model=list[UserSchema])
-async def read_users(skip: int = 0, limit: int = 100, current_user: User = Depends(get_current_active_admin), db: AsyncSession = Depends(get_db)):
+@router.get("/", response_model=PaginatedResponse[UserSchema])
+async def read_users(pagination: CursorParams = Depends(get_cursor_params), current_user: Principal = Depends(get_current_active_admin), db: AsyncSession = Depends(get_db)):
     """
     Get the list of all users (only for administrators).
     """
     from app.crud.user import user
-    from sqlalchemy import select
-    users = await user.get_multi(db, skip=skip, limit=limit, query=select(User))
-    return users
+    try:
+        users, next_cursor = await user.get_multi_keyset(
+            db, cursor=pagination.cursor, limit=pagination.limit
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return PaginatedResponse(items=users, size=pagination.limit, next_cursor=next_cursor)
@@ -0,0 +1,171 @@
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+
+from app.core.config import settings
+
+
+class TTLCache:
+    """
+    In-process cache with per-entry expiry and LRU eviction once `maxsize`
+    entries are stored.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+
+class TieredCache:
+    """
+    Namespaced cache of JSON-serializable values. Entries live in an
+    in-process TTLCache and, when CACHE_REDIS_URL is set, in Redis as well,
+    so that workers share them. The local tier then keeps entries for at most
+    CACHE_LOCAL_TTL_SECONDS, which bounds how long an invalidation made by
+    another worker can go unnoticed. Redis errors fall back to the local tier.
+    Without Redis, `unshared_ttl` caps the local TTL for data whose
+    invalidations must reach every worker quickly; 0 disables the cache.
+    """
+
+    def __init__(self, namespace: str, maxsize: int, ttl: float, unshared_ttl: Optional[float] = None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.redis_url = settings.CACHE_REDIS_URL
+        if self.redis_url:
+            local_ttl = min(ttl, settings.CACHE_LOCAL_TTL_SECONDS)
+        elif unshared_ttl is not None:
+            local_ttl = min(ttl, unshared_ttl)
+        else:
+            local_ttl = ttl
+        self.local = TTLCache(maxsize=maxsize, ttl=local_ttl)
+        self._redis = None
+
+    def _get_redis(self):
+        if self._redis is None and self.redis_url:
+            import redis.asyncio as redis
+
+            self._redis = redis.from_url(self.redis_url)
+        return self._redis
+
+    def _key(self, key: Hashable) -> str:
+        return f"cache:{self.namespace}:{key}"
+
+    async def get(self, key: Hashable) -> Optional[Any]:
+        value = self.local.get(key)
+        if value is not None:
+            return value
+
+        client = self._get_redis()
+        if client is None:
+            return None
+
+        try:
+            raw = await client.get(self._key(key))
+        except Exception as e:
+            logging.warning(f"Cache '{self.namespace}' read failed: {e}")
+            return None
+        if raw is None:
+            return None
+
+        value = json.loads(raw)
+        self.local.set(key, value)
+        return value
+
+    async def set(self, key: Hashable, value: Any) -> None:
+        value = jsonable_encoder(value)
+        self.local.set(key, value)
+
+        client = self._get_redis()
+        if client is None:
+            return
+
+        try:
+            await client.set(self._key(key), json.dumps(value), ex=int(self.ttl))
+        except Exception as e:
+            logging.warning(f"Cache '{self.namespace}' write failed: {e}")
+
+    async def delete(self, key: Hashable) -> None:
+        self.local.delete(key)
+
+        client = self._get_redis()
+        if client is None:
+            return
+
+        try:
+            await client.delete(self._key(key))
+        except Exception as e:
+            logging.warning(f"Cache '{self.namespace}' invalidation failed: {e}")
+
+    async def clear(self) -> None:
+        self.local.clear()
+
+        client = self._get_redis()
+        if client is None:
+            return
+
+        try:
+            async for redis_key in client.scan_iter(match=self._key("*")):
+                await client.delete(redis_key)
+        except Exception as e:
+            logging.warning(f"Cache '{self.namespace}' invalidation failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {"namespace": self.namespace, **self.local.stats()}
+
+
+principal_cache = TieredCache(
+    "principal",
+    maxsize=settings.PRINCIPAL_CACHE_MAX_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS
+)
@@ -8,12 +8,13 @@ celery_app = Celery(
     "worker",
     broker=settings.CELERY_BROKER_URL,
     backend=settings.CELERY_RESULT_BACKEND,
-    include=["app.tasks.users", "app.tasks.orders"]
+    include=["app.tasks.users", "app.tasks.orders", "app.tasks.products"]
 )
 
 celery_app.conf.task_routes = {
     "app.tasks.users.*": {"queue": "users"},
-    "app.tasks.orders.*": {"queue": "orders"}
+    "app.tasks.orders.*": {"queue": "orders"},
+    "app.tasks.products.*": {"queue": "products"}
 }
 
 celery_app.conf.beat_schedule = {
@@ -1,5 +1,5 @@
 from typing import List, Optional, Union
-from pydantic import AnyHttpUrl, PostgresDsn, field_validator
+from pydantic import AnyHttpUrl, PostgresDsn, field_validator, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -21,6 +21,10 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    TOKEN_CACHE_MAX_SIZE: int = 10000
+
+    # Password hashing settings
+    PASSWORD_HASH_CONCURRENCY: int = 4
 
     # Email settings
     SMTP_SERVER: str
@@ -37,6 +41,37 @@ class Settings(BaseSettings):
     CELERY_BROKER_URL: str
     CELERY_RESULT_BACKEND: str
 
+    # Search settings
+    SEARCH_TEXT_CONFIG: str = "english"
+
+    # Cache settings
+    CACHE_REDIS_URL: Optional[str] = None
+    CACHE_LOCAL_TTL_SECONDS: int = 5
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+    PRINCIPAL_CACHE_MAX_SIZE: int = 10000
+    CATALOG_CACHE_TTL_SECONDS: int = 300
+    CATALOG_CACHE_MAX_SIZE: int = 1000
+    CART_CACHE_TTL_SECONDS: int = 300
+    CART_CACHE_MAX_SIZE: int = 10000
+    CART_STORAGE_BACKEND: str = "database"  # database, redis or memory
+    CART_REDIS_URL: Optional[str] = None
+    CART_TTL_SECONDS: int = 7 * 24 * 60 * 60
+    INFO_SNAPSHOT_TTL_SECONDS: int = 60
+
+    # Chat settings
+    CHAT_BACKPLANE_URL: Optional[str] = None
+    CHAT_SEND_QUEUE_SIZE: int = 100
+    CHAT_SLOW_CLIENT_POLICY: str = "drop_oldest"  # drop_oldest, drop_newest or disconnect
+    CHAT_WRITER_BATCH_SIZE: int = 100
+    CHAT_WRITER_FLUSH_INTERVAL_MS: int = 50
+    CHAT_WRITER_MAX_BUFFER: int = 1000
+    CHAT_SESSION_CACHE_TTL_SECONDS: int = 300
+    CHAT_SESSION_CACHE_MAX_SIZE: int = 10000
+    CHAT_RESUME_MAX_MESSAGES: int = 200
+    CHAT_HEARTBEAT_INTERVAL_SECONDS: int = 30
+    CHAT_IDLE_TIMEOUT_SECONDS: int = 90
+    CHAT_TYPING_INTERVAL_SECONDS: int = 3
+
     # CORS settings
     BACKEND_CORS_ORIGINS: List[AnyHttpUrl] = []
 
@@ -48,6 +83,12 @@ class Settings(BaseSettings):
         elif isinstance(v, (list, str)):
             return v
 
+    @model_validator(mode="after")
+    def check_cart_storage(self) -> "Settings":
+        if self.CART_STORAGE_BACKEND == "redis" and not self.CART_REDIS_URL:
+            raise ValueError("CART_REDIS_URL is required when CART_STORAGE_BACKEND is redis")
+        return self
+
     @property
     def async_database_url(self) -> Optional[str]:
         return str(self.DATABASE_URL).replace("postgresql", "postgresql+asyncpg", 1) if self.DATABASE_URL else None
@@ -1,14 +1,87 @@
+import asyncio
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Any, Optional, Union
+from typing import Any, Callable, Dict, Optional, Union
 
 from jose import jwt
 from passlib.context import CryptContext
 
+from app.core.cache import TTLCache
 from app.core.config import settings
 
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Payloads of already verified tokens, keyed by token digest and kept until
+# the token expires (at most one access token lifetime)
+token_cache = TTLCache(
+    maxsize=settings.TOKEN_CACHE_MAX_SIZE,
+    ttl=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+)
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt hashing and verification in a bounded thread pool so that
+    they don't block the event loop. At most `concurrency` operations run at
+    once; the rest wait in a queue whose depth is tracked for monitoring.
+    """
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.in_flight = 0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.concurrency, thread_name_prefix="password-hasher"
+            )
+        return self._executor
+
+    async def _run(self, func: Callable, *args: Any) -> Any:
+        self.queue_depth += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queue_depth -= 1
+
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(pwd_context.hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(pwd_context.verify, plain_password, hashed_password)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "concurrency": self.concurrency,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(settings.PASSWORD_HASH_CONCURRENCY)
+
 
 def create_access_token(subject: Union[str, Any]) -> str:
     expire = datetime.utcnow() + timedelta(
@@ -36,7 +109,23 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.verify(plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await password_hasher.hash(password)
+
+
 def decode_token(token: str) -> dict:
-    return jwt.decode(
+    key = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(key)
+    if payload is not None:
+        return dict(payload)
+
+    payload = jwt.decode(
         token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
     )
+    if "exp" in payload:
+        token_cache.set(key, dict(payload), ttl=payload["exp"] - time.time())
+    return payload
@@ -1,7 +1,11 @@
-from typing import Any, Dict, Generic, List, Optional, Type, TypeVar, Union
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Dict, Generic, List, Optional, Sequence, Tuple, Type, TypeVar, Union
 from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
-from sqlalchemy import select
+from sqlalchemy import literal, select, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql.expression import Select
 
@@ -12,6 +16,73 @@ ModelType = TypeVar("ModelType", bound=DBBaseModel)
 CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
 UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
 
+UNIT_OF_WORK = "unit_of_work"
+
+
+class UnitOfWork:
+    """
+    Transaction spanning several CRUD calls. Inside it CRUD writes only
+    flush, and everything is committed once on exit, or rolled back if the
+    block raises. A unit of work opened inside another one joins it.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self._outermost = False
+
+    async def __aenter__(self) -> AsyncSession:
+        self._outermost = not self.db.info.get(UNIT_OF_WORK, False)
+        self.db.info[UNIT_OF_WORK] = True
+        return self.db
+
+    async def __aexit__(self, exc_type, exc, tb) -> bool:
+        if not self._outermost:
+            return False
+        del self.db.info[UNIT_OF_WORK]
+        if exc_type is None:
+            await self.db.commit()
+        else:
+            await self.db.rollback()
+        return False
+
+
+async def save_changes(db: AsyncSession) -> None:
+    """Commits the session, or only flushes it inside a unit of work"""
+    if db.info.get(UNIT_OF_WORK, False):
+        await db.flush()
+    else:
+        await db.commit()
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Encodes keyset values into an opaque cursor token"""
+    raw = json.dumps(jsonable_encoder(list(values)), separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, columns: Sequence[Any]) -> List[Any]:
+    """Decodes a cursor token back into keyset values for the given columns"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError("Invalid cursor")
+
+    decoded = []
+    for column, value in zip(columns, values):
+        try:
+            if column.type.python_type is datetime:
+                value = datetime.fromisoformat(value)
+            else:
+                value = column.type.python_type(value)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid cursor")
+        decoded.append(value)
+    return decoded
+
 
 class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
     def __init__(self, model: Type[ModelType]):
@@ -34,12 +105,49 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         result = await db.execute(query)
         return result.scalars().all()
 
+    async def get_multi_keyset(
+        self,
+        db: AsyncSession,
+        *,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        query: Optional[Select] = None,
+        order_by: Sequence[str] = ("id",),
+        descending: bool = False
+    ) -> Tuple[List[ModelType], Optional[str]]:
+        """
+        Gets a page of objects ordered by the order_by columns, starting after
+        the cursor. Returns the page and the cursor of the next page, if any.
+        """
+        if query is None:
+            query = select(self.model)
+
+        columns = [getattr(self.model, name) for name in order_by]
+
+        if cursor:
+            values = decode_cursor(cursor, columns)
+            key = tuple_(*columns)
+            position = tuple_(*[literal(v, c.type) for c, v in zip(columns, values)])
+            query = query.where(key < position if descending else key > position)
+
+        query = query.order_by(
+            *[c.desc() if descending else c.asc() for c in columns]
+        ).limit(limit + 1)
+
+        result = await db.execute(query)
+        items = result.scalars().all()
+
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            next_cursor = encode_cursor([getattr(items[-1], name) for name in order_by])
+        return items, next_cursor
+
     async def create(self, db: AsyncSession, *, obj_in: CreateSchemaType) -> ModelType:
         obj_in_data = jsonable_encoder(obj_in)
         db_obj = self.model(**obj_in_data)
         db.add(db_obj)
-        await db.commit()
-        await db.refresh(db_obj)
+        await save_changes(db)
         return db_obj
 
     async def update(
@@ -58,12 +166,11 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
             if field in update_data:
                 setattr(db_obj, field, update_data[field])
         db.add(db_obj)
-        await db.commit()
-        await db.refresh(db_obj)
+        await save_changes(db)
         return db_obj
 
     async def remove(self, db: AsyncSession, *, id: int) -> ModelType:
         obj = await db.get(self.model, id)
         await db.delete(obj)
-        await db.commit()
+        await save_changes(db)
         return obj
@@ -1,9 +1,12 @@
-from typing import List, Optional
-from sqlalchemy import select, and_
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import Integer, column, delete, func, literal, select, values, and_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased, joinedload
 
-from app.crud.base import CRUDBase
+from app.crud.base import CRUDBase, save_changes
 from app.db.models.cart import Cart, CartItem
+from app.db.models.product import Product
 from app.schemas.cart import CartCreate, CartItemCreate, CartItemUpdate
 
 
@@ -13,6 +16,30 @@ class CRUDCart(CRUDBase[Cart, CartCreate, CartCreate]):
         result = await db.execute(query)
         return result.scalar_one_or_none()
 
+    async def get_with_items(self, db: AsyncSession, *, user_id: int) -> Optional[Cart]:
+        """Gets the user's cart with its items and their products in one joined query"""
+        query = (
+            select(self.model)
+            .where(self.model.user_id == user_id)
+            .options(joinedload(self.model.items).joinedload(CartItem.product))
+        )
+        result = await db.execute(query)
+        return result.unique().scalar_one_or_none()
+
+    def upsert_query(self, *, user_id: int):
+        """INSERT ... ON CONFLICT statement returning the id of the user's cart, existing or new"""
+        return (
+            pg_insert(self.model)
+            .values(user_id=user_id)
+            .on_conflict_do_update(index_elements=[self.model.user_id], set_={"updated_at": func.now()})
+            .returning(self.model.id)
+        )
+
+    async def upsert(self, db: AsyncSession, *, user_id: int) -> int:
+        """Gets the id of the user's cart, creating the cart if needed. Does not commit."""
+        result = await db.execute(self.upsert_query(user_id=user_id))
+        return result.scalar_one()
+
     async def get_or_create(self, db: AsyncSession, *, user_id: int) -> Cart:
         cart = await self.get_by_user(db, user_id=user_id)
         if not cart:
@@ -45,22 +72,97 @@ class CRUDCartItem(CRUDBase[CartItem, CartItemCreate, CartItemUpdate]):
         result = await db.execute(query)
         return result.scalars().all()
 
+    async def add_or_increment(
+        self, db: AsyncSession, *, user_id: int, product_id: int, quantity: int
+    ) -> Optional[Tuple[CartItem, float]]:
+        """
+        Adds the product to the user's cart, or increments its quantity, in a
+        single statement: the cart and then the item are upserted in CTEs, the
+        item from the product row only if it is available. Returns the item
+        and the product price, or None when the product is missing or
+        unavailable. Does not commit.
+        """
+        cart_row = cart.upsert_query(user_id=user_id).cte("cart_row")
+        source = select(
+            cart_row.c.id, Product.id, literal(quantity, Integer)
+        ).where(
+            and_(
+                Product.id == product_id,
+                Product.is_available == True
+            )
+        )
+        upsert = pg_insert(self.model).from_select(["cart_id", "product_id", "quantity"], source)
+        item_row = (
+            upsert.on_conflict_do_update(
+                index_elements=[self.model.cart_id, self.model.product_id],
+                set_={
+                    "quantity": self.model.quantity + upsert.excluded.quantity,
+                    "updated_at": func.now()
+                }
+            )
+            .returning(*self.model.__table__.c)
+            .cte("item_row")
+        )
+        item = aliased(self.model, item_row)
+        query = select(item, Product.price).join(Product, Product.id == item.product_id)
+        result = await db.execute(query)
+        row = result.one_or_none()
+        return tuple(row) if row else None
+
+    async def upsert_many(
+        self, db: AsyncSession, *, cart_id: int, quantities: Dict[int, int], increment: bool
+    ) -> List[int]:
+        """
+        Sets, or with `increment` adds to, the quantities of the products in the
+        cart with one INSERT ... ON CONFLICT. Unavailable or missing products
+        are skipped; returns the ids of the products written. Does not commit.
+        """
+        if not quantities:
+            return []
+
+        rows = values(
+            column("product_id", Integer), column("quantity", Integer), name="rows"
+        ).data(list(quantities.items()))
+        source = (
+            select(literal(cart_id, Integer), Product.id, rows.c.quantity)
+            .join(rows, rows.c.product_id == Product.id)
+            .where(Product.is_available == True)
+        )
+        query = pg_insert(self.model).from_select(["cart_id", "product_id", "quantity"], source)
+        quantity = query.excluded.quantity
+        if increment:
+            quantity = self.model.quantity + quantity
+        query = query.on_conflict_do_update(
+            index_elements=[self.model.cart_id, self.model.product_id],
+            set_={"quantity": quantity, "updated_at": func.now()}
+        ).returning(self.model.product_id)
+        result = await db.execute(query)
+        return list(result.scalars().all())
+
+    async def remove_products(self, db: AsyncSession, *, cart_id: int, product_ids: List[int]) -> None:
+        """Deletes the products from the cart with one statement. Does not commit."""
+        if not product_ids:
+            return
+        query = delete(self.model).where(
+            and_(
+                self.model.cart_id == cart_id,
+                self.model.product_id.in_(product_ids)
+            )
+        )
+        await db.execute(query)
+
     async def update_quantity(
         self, db: AsyncSession, *, cart_item: CartItem, quantity: int
     ) -> CartItem:
         cart_item.quantity = quantity
         db.add(cart_item)
-        await db.commit()
-        await db.refresh(cart_item)
+        await save_changes(db)
         return cart_item
 
     async def remove_by_cart(self, db: AsyncSession, *, cart_id: int) -> None:
-        query = select(self.model).where(self.model.cart_id == cart_id)
-        result = await db.execute(query)
-        items = result.scalars().all()
-        for item in items:
-            await db.delete(item)
-        await db.commit()
+        """Deletes all items of the cart with one statement. Does not commit."""
+        query = delete(self.model).where(self.model.cart_id == cart_id)
+        await db.execute(query)
 
 
 cart = CRUDCart(Cart)
@@ -1,12 +1,19 @@
-from typing import List, Optional
-from sqlalchemy import select, and_
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import insert, literal, select, true, tuple_, update, and_, func
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 
-from app.crud.base import CRUDBase
+from app.crud.base import CRUDBase, decode_cursor, encode_cursor, save_changes
 from app.db.models.chat import ChatSession, ChatMessage
+from app.db.models.user import User
 from app.schemas.chat import ChatSessionCreate, ChatMessageCreate, ChatMessageUpdate
 
 
+def message_cursor(message: ChatMessage) -> str:
+    """Cursor pointing at the message in a session's (created_at, id) order"""
+    return encode_cursor([message.created_at, message.id])
+
+
 class CRUDChatSession(CRUDBase[ChatSession, ChatSessionCreate, ChatSessionCreate]):
     async def get_by_user(
         self, db: AsyncSession, *, user_id: int, is_active: bool = True
@@ -20,13 +27,89 @@ class CRUDChatSession(CRUDBase[ChatSession, ChatSessionCreate, ChatSessionCreate
         result = await db.execute(query)
         return result.scalar_one_or_none()
 
-    async def get_active(self, db: AsyncSession) -> List[ChatSession]:
+    async def get_active(
+        self, db: AsyncSession, *, ids: Optional[List[int]] = None
+    ) -> List[ChatSession]:
         query = select(self.model).where(self.model.is_active == True)
+        if ids is not None:
+            query = query.where(self.model.id.in_(ids))
         result = await db.execute(query)
         return result.scalars().all()
 
+    async def get_active_overview(
+        self,
+        db: AsyncSession,
+        *,
+        viewer_id: int,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        messages_limit: int = 10
+    ) -> Tuple[List[Tuple[ChatSession, int, List[ChatMessage]]], Optional[str]]:
+        """
+        Gets a page of active sessions, newest first, each with its latest
+        messages (oldest to newest) and the count of messages unread by the
+        viewer, in a single statement: the messages come from a LATERAL
+        subquery and the count from a correlated scalar subquery.
+        """
+        page = select(self.model).where(self.model.is_active == True)
+        if cursor:
+            last_id, = decode_cursor(cursor, [self.model.id])
+            page = page.where(self.model.id < literal(last_id))
+        page = page.order_by(self.model.id.desc()).limit(limit + 1).subquery("page")
+        session = aliased(self.model, page)
+
+        latest = (
+            select(ChatMessage)
+            .where(ChatMessage.session_id == session.id)
+            .order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc())
+            .limit(messages_limit)
+            .lateral("latest")
+        )
+        message = aliased(ChatMessage, latest)
+
+        unread_count = (
+            select(func.count(ChatMessage.id))
+            .where(
+                and_(
+                    ChatMessage.session_id == session.id,
+                    ChatMessage.sender_id != viewer_id,
+                    ChatMessage.is_read == False
+                )
+            )
+            .scalar_subquery()
+        )
+
+        query = (
+            select(session, unread_count.label("unread_count"), message)
+            .outerjoin(message, true())
+            .order_by(session.id.desc(), message.created_at, message.id)
+        )
+        result = await db.execute(query)
+
+        overview: Dict[int, Tuple[ChatSession, int, List[ChatMessage]]] = {}
+        for db_session, count, db_message in result.all():
+            if db_session.id not in overview:
+                overview[db_session.id] = (db_session, count, [])
+            if db_message is not None:
+                overview[db_session.id][2].append(db_message)
+
+        items = list(overview.values())
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            next_cursor = encode_cursor([items[-1][0].id])
+        return items, next_cursor
+
 
 class CRUDChatMessage(CRUDBase[ChatMessage, ChatMessageCreate, ChatMessageUpdate]):
+    async def create_many(
+        self, db: AsyncSession, *, objs_in: List[Dict]
+    ) -> List[ChatMessage]:
+        """Inserts the messages with one multi-row INSERT ... RETURNING, without committing"""
+        query = insert(self.model).returning(self.model, sort_by_parameter_order=True)
+        result = await db.scalars(query, objs_in)
+        return result.all()
+
     async def get_by_session(
         self, db: AsyncSession, *, session_id: int, skip: int = 0, limit: int = 100
     ) -> List[ChatMessage]:
@@ -39,6 +122,71 @@ class CRUDChatMessage(CRUDBase[ChatMessage, ChatMessageCreate, ChatMessageUpdate
         result = await db.execute(query)
         return result.scalars().all()
 
+    async def get_history(
+        self,
+        db: AsyncSession,
+        *,
+        session_id: int,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+        limit: int = 100
+    ) -> Tuple[List[ChatMessage], Optional[str], Optional[str]]:
+        """
+        Gets a page of the session's messages, newest first: the latest ones,
+        the ones older than `before`, or the oldest of the ones newer than
+        `after`. Returns the page, the cursor of the older messages (if any)
+        and the cursor of the newest message returned.
+        """
+        columns = [self.model.created_at, self.model.id]
+        key = tuple_(*columns)
+        query = select(self.model).where(self.model.session_id == session_id)
+
+        if after:
+            values = decode_cursor(after, columns)
+            position = tuple_(*[literal(v, c.type) for c, v in zip(columns, values)])
+            query = query.where(key > position).order_by(*columns)
+        else:
+            if before:
+                values = decode_cursor(before, columns)
+                position = tuple_(*[literal(v, c.type) for c, v in zip(columns, values)])
+                query = query.where(key < position)
+            query = query.order_by(*[c.desc() for c in columns])
+
+        result = await db.execute(query.limit(limit + 1))
+        messages = result.scalars().all()
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        if after:
+            messages.reverse()
+
+        before_cursor = None
+        if messages and (has_more or after):
+            before_cursor = message_cursor(messages[-1])
+        after_cursor = message_cursor(messages[0]) if messages else after
+        return messages, before_cursor, after_cursor
+
+    async def get_missed(
+        self, db: AsyncSession, *, session_id: int, after: str, limit: int = 100
+    ) -> List[Tuple[ChatMessage, str]]:
+        """Gets the messages newer than the cursor, oldest first, with their senders' emails"""
+        columns = [self.model.created_at, self.model.id]
+        values = decode_cursor(after, columns)
+        position = tuple_(*[literal(v, c.type) for c, v in zip(columns, values)])
+        query = (
+            select(self.model, User.email)
+            .join(User, User.id == self.model.sender_id)
+            .where(
+                and_(
+                    self.model.session_id == session_id,
+                    tuple_(*columns) > position
+                )
+            )
+            .order_by(*columns)
+            .limit(limit)
+        )
+        result = await db.execute(query)
+        return [tuple(row) for row in result.all()]
+
     async def get_unread(
         self, db: AsyncSession, *, session_id: int, skip: int = 0, limit: int = 100
     ) -> List[ChatMessage]:
@@ -56,22 +204,57 @@ class CRUDChatMessage(CRUDBase[ChatMessage, ChatMessageCreate, ChatMessageUpdate
         result = await db.execute(query)
         return result.scalars().all()
 
+    async def count_unread_by_session(
+        self, db: AsyncSession, *, session_ids: List[int], exclude_sender_id: int
+    ) -> Dict[int, int]:
+        """Counts unread messages per session with a single grouped query"""
+        if not session_ids:
+            return {}
+
+        query = (
+            select(self.model.session_id, func.count())
+            .where(
+                and_(
+                    self.model.session_id.in_(session_ids),
+                    self.model.sender_id != exclude_sender_id,
+                    self.model.is_read == False
+                )
+            )
+            .group_by(self.model.session_id)
+        )
+        result = await db.execute(query)
+        counts = dict(result.all())
+        return {session_id: counts.get(session_id, 0) for session_id in session_ids}
+
+    async def count_unread(
+        self, db: AsyncSession, *, session_id: int, exclude_sender_id: int
+    ) -> int:
+        counts = await self.count_unread_by_session(
+            db, session_ids=[session_id], exclude_sender_id=exclude_sender_id
+        )
+        return counts[session_id]
+
     async def mark_as_read(
         self, db: AsyncSession, *, session_id: int, sender_id: int
-    ) -> None:
-        query = select(self.model).where(
-            and_(
-                self.model.session_id == session_id,
-                self.model.sender_id != sender_id,
-                self.model.is_read == False
+    ) -> List[int]:
+        """Marks the messages of other senders as read; returns their ids"""
+        query = (
+            update(self.model)
+            .where(
+                and_(
+                    self.model.session_id == session_id,
+                    self.model.sender_id != sender_id,
+                    self.model.is_read == False
+                )
             )
+            .values(is_read=True)
+            .returning(self.model.id)
+            .execution_options(synchronize_session=False)
         )
         result = await db.execute(query)
-        messages = result.scalars().all()
-        for message in messages:
-            message.is_read = True
-            db.add(message)
-        await db.commit()
+        message_ids = list(result.scalars().all())
+        await save_changes(db)
+        return message_ids
 
 
 chat_session = CRUDChatSession(ChatSession)
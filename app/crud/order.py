@@ -1,6 +1,9 @@
-from typing import List
-from sqlalchemy import select
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import insert, select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from sqlalchemy.sql.expression import Select
 
 from app.crud.base import CRUDBase
 from app.db.models.order import Order, OrderItem, OrderStatus
@@ -8,6 +11,17 @@ from app.schemas.order import OrderCreate, OrderUpdate, OrderItemCreate
 
 
 class CRUDOrder(CRUDBase[Order, OrderCreate, OrderUpdate]):
+    def _with_items(self) -> Select:
+        """Select orders with their items and the items' products eager-loaded"""
+        return select(self.model).options(
+            selectinload(self.model.items).selectinload(OrderItem.product)
+        )
+
+    async def get_with_items(self, db: AsyncSession, *, id: int) -> Optional[Order]:
+        query = self._with_items().where(self.model.id == id)
+        result = await db.execute(query)
+        return result.scalar_one_or_none()
+
     async def get_by_user(
         self, db: AsyncSession, *, user_id: int, skip: int = 0, limit: int = 100
     ) -> List[Order]:
@@ -20,6 +34,25 @@ class CRUDOrder(CRUDBase[Order, OrderCreate, OrderUpdate]):
         result = await db.execute(query)
         return result.scalars().all()
 
+    async def get_by_user_with_items(
+        self,
+        db: AsyncSession,
+        *,
+        user_id: int,
+        cursor: Optional[str] = None,
+        limit: int = 100
+    ) -> Tuple[List[Order], Optional[str]]:
+        """Gets a page of the user's orders, newest first"""
+        query = self._with_items().where(self.model.user_id == user_id)
+        return await self.get_multi_keyset(
+            db,
+            cursor=cursor,
+            limit=limit,
+            query=query,
+            order_by=("created_at", "id"),
+            descending=True
+        )
+
     async def get_by_status(
         self, db: AsyncSession, *, status: OrderStatus, skip: int = 0, limit: int = 100
     ) -> List[Order]:
@@ -32,23 +65,54 @@ class CRUDOrder(CRUDBase[Order, OrderCreate, OrderUpdate]):
         result = await db.execute(query)
         return result.scalars().all()
 
+    async def get_multi_with_items(
+        self,
+        db: AsyncSession,
+        *,
+        status: Optional[OrderStatus] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+        limit: int = 100
+    ) -> Tuple[List[Order], Optional[str]]:
+        """Gets a page of all orders, oldest first"""
+        query = self._with_items()
+
+        if status:
+            query = query.where(self.model.status == status)
+
+        if created_from is not None:
+            query = query.where(self.model.created_at >= created_from)
+
+        if created_to is not None:
+            query = query.where(self.model.created_at < created_to)
+
+        return await self.get_multi_keyset(
+            db,
+            cursor=cursor,
+            limit=limit,
+            query=query,
+            order_by=("created_at", "id")
+        )
+
     async def create_with_items(
-        self, db: AsyncSession, *, obj_in: OrderCreate
+        self, db: AsyncSession, *, obj_in: Dict[str, Any], items: List[Dict[str, Any]]
     ) -> Order:
-        order = await self.create(db, obj_in=obj_in)
-
-        for item in obj_in.items:
-            order_item = OrderItem(
-                order_id=order.id,
-                product_id=item.product_id,
-                quantity=item.quantity,
-                price=item.price
+        """
+        Inserts the order and all its items with two INSERT ... RETURNING
+        statements. Does not commit, so it can share the caller's transaction.
+        """
+        query = insert(self.model).values(**obj_in).returning(self.model)
+        result = await db.execute(query)
+        db_order = result.scalar_one()
+
+        if items:
+            await db.execute(
+                insert(OrderItem).returning(OrderItem.id),
+                [{**item, "order_id": db_order.id} for item in items]
             )
-            db.add(order_item)
 
-        await db.commit()
-        await db.refresh(order)
-        return order
+        return db_order
 
 
 class CRUDOrderItem(CRUDBase[OrderItem, OrderItemCreate, OrderItemCreate]):
@@ -1,8 +1,9 @@
-from typing import List, Optional
-from sqlalchemy import select, and_
+from typing import Any, Dict, List, Optional, Tuple, Union
+from sqlalchemy import Float, and_, func, literal, literal_column, or_, select, tuple_, type_coerce, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.crud.base import CRUDBase
+from app.core.config import settings
+from app.crud.base import CRUDBase, UnitOfWork, decode_cursor, encode_cursor, save_changes
 from app.db.models.product import Category, Product
 from app.schemas.product import CategoryCreate, CategoryUpdate, ProductCreate, ProductUpdate
 
@@ -25,6 +26,11 @@ class CRUDProduct(CRUDBase[Product, ProductCreate, ProductUpdate]):
         result = await db.execute(query)
         return result.scalar_one_or_none()
 
+    async def get_by_ids(self, db: AsyncSession, *, ids: List[int]) -> List[Product]:
+        query = select(self.model).where(self.model.id.in_(ids))
+        result = await db.execute(query)
+        return result.scalars().all()
+
     async def get_by_category(
         self, db: AsyncSession, *, category_id: int, skip: int = 0, limit: int = 100
     ) -> List[Product]:
@@ -37,6 +43,47 @@ class CRUDProduct(CRUDBase[Product, ProductCreate, ProductUpdate]):
         result = await db.execute(query)
         return result.scalars().all()
 
+    def _search_vector(self):
+        """Weighted tsvector of the product name, category name and description"""
+        config = settings.SEARCH_TEXT_CONFIG
+        category_name = (
+            select(Category.name)
+            .where(Category.id == self.model.category_id)
+            .scalar_subquery()
+        )
+        weighted = [
+            func.setweight(func.to_tsvector(config, func.coalesce(text, "")), literal_column(f"'{weight}'"))
+            for text, weight in (
+                (self.model.name, "A"),
+                (category_name, "B"),
+                (self.model.description, "C")
+            )
+        ]
+        return weighted[0].op("||")(weighted[1]).op("||")(weighted[2])
+
+    async def update_search_vector(self, db: AsyncSession, *, id: Optional[int] = None) -> None:
+        """Recomputes the search vector of a product, or of all products if no id is given"""
+        query = update(self.model).values(
+            search_vector=self._search_vector(),
+            updated_at=self.model.updated_at
+        )
+        if id is not None:
+            query = query.where(self.model.id == id)
+        await db.execute(query.execution_options(synchronize_session=False))
+        await save_changes(db)
+
+    async def create(self, db: AsyncSession, *, obj_in: ProductCreate) -> Product:
+        async with UnitOfWork(db):
+            db_obj = await super().create(db, obj_in=obj_in)
+            await self.update_search_vector(db, id=db_obj.id)
+        return db_obj
+
+    async def update(self, db: AsyncSession, *, db_obj: Product, obj_in: Union[ProductUpdate, Dict[str, Any]]) -> Product:
+        async with UnitOfWork(db):
+            db_obj = await super().update(db, db_obj=db_obj, obj_in=obj_in)
+            await self.update_search_vector(db, id=db_obj.id)
+        return db_obj
+
     async def search(
         self,
         db: AsyncSession,
@@ -46,13 +93,25 @@ class CRUDProduct(CRUDBase[Product, ProductCreate, ProductUpdate]):
         min_price: Optional[float] = None,
         max_price: Optional[float] = None,
         is_available: Optional[bool] = None,
-        skip: int = 0,
+        cursor: Optional[str] = None,
         limit: int = 100
-    ) -> List[Product]:
+    ) -> Tuple[List[Product], Optional[str]]:
         conditions = []
+        rank = None
 
         if query:
-            conditions.append(self.model.name.ilike(f"%{query}%"))
+            # Full-text match, or trigram similarity on the name to tolerate typos
+            ts_query = func.websearch_to_tsquery(settings.SEARCH_TEXT_CONFIG, query)
+            conditions.append(or_(
+                self.model.search_vector.op("@@")(ts_query),
+                self.model.name.op("%")(query)
+            ))
+            # Products whose search vector isn't backfilled yet rank on the name alone
+            rank = type_coerce(
+                func.coalesce(func.ts_rank(self.model.search_vector, ts_query), 0)
+                + func.similarity(self.model.name, query),
+                Float
+            )
 
         if category_id:
             conditions.append(self.model.category_id == category_id)
@@ -66,11 +125,54 @@ class CRUDProduct(CRUDBase[Product, ProductCreate, ProductUpdate]):
         if is_available is not None:
             conditions.append(self.model.is_available == is_available)
 
-        query = select(self.model)
-        if conditions:
-            query = query.where(and_(*conditions))
-        query = query.offset(skip).limit(limit)
+        if rank is None:
+            query = select(self.model)
+            if conditions:
+                query = query.where(and_(*conditions))
+            return await self.get_multi_keyset(db, cursor=cursor, limit=limit, query=query)
+
+        return await self._search_ranked(
+            db, conditions=conditions, rank=rank, cursor=cursor, limit=limit
+        )
+
+    async def _search_ranked(
+        self, db: AsyncSession, *, conditions: list, rank, cursor: Optional[str], limit: int
+    ) -> Tuple[List[Product], Optional[str]]:
+        """Gets a page of search results, most relevant first, paginated over (rank, id)"""
+        query = select(self.model, rank.label("rank")).where(and_(*conditions))
+
+        if cursor:
+            last_rank, last_id = decode_cursor(cursor, [rank, self.model.id])
+            query = query.where(
+                tuple_(rank, self.model.id) < tuple_(literal(last_rank, Float), literal(last_id))
+            )
+
+        query = query.order_by(rank.desc(), self.model.id.desc()).limit(limit + 1)
+        result = await db.execute(query)
+        rows = result.all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor([rows[-1].rank, rows[-1][0].id])
+        return [row[0] for row in rows], next_cursor
 
+    async def suggest(self, db: AsyncSession, *, prefix: str, limit: int = 10) -> List[Product]:
+        """Gets available products whose name or a word in it starts with the prefix"""
+        query = (
+            select(self.model)
+            .where(
+                and_(
+                    self.model.is_available == True,
+                    or_(
+                        self.model.name.istartswith(prefix, autoescape=True),
+                        self.model.name.icontains(f" {prefix}", autoescape=True)
+                    )
+                )
+            )
+            .order_by(func.similarity(self.model.name, prefix).desc(), self.model.id)
+            .limit(limit)
+        )
         result = await db.execute(query)
         return result.scalars().all()
 
@@ -1,9 +1,10 @@
-from typing import Optional
+from typing import Any, Dict, Optional, Union
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.security import get_password_hash, verify_password
-from app.crud.base import CRUDBase
+from app.core.cache import principal_cache
+from app.core.security import get_password_hash_async, verify_password_async
+from app.crud.base import CRUDBase, save_changes
 from app.db.models.user import User
 from app.schemas.user import UserCreate, UserUpdate
 
@@ -18,25 +19,31 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
         print(obj_in, "obj_in")
         db_obj = User(
             email=obj_in.email,
-            password=get_password_hash(obj_in.password),
+            password=await get_password_hash_async(obj_in.password),
             first_name=obj_in.first_name,
             last_name=obj_in.last_name,
             phone=obj_in.phone,
         )
         db.add(db_obj)
-        await db.commit()
-        await db.refresh(db_obj)
+        await save_changes(db)
         return db_obj
 
     async def update(
-        self, db: AsyncSession, *, db_obj: User, obj_in: UserUpdate
+        self, db: AsyncSession, *, db_obj: User, obj_in: Union[UserUpdate, Dict[str, Any]]
     ) -> User:
-        update_data = obj_in.dict(exclude_unset=True)
+        if isinstance(obj_in, dict):
+            update_data = dict(obj_in)
+        else:
+            update_data = obj_in.dict(exclude_unset=True)
         if "password" in update_data:
-            password = get_password_hash(update_data["password"])
+            password = await get_password_hash_async(update_data["password"])
             del update_data["password"]
             update_data["password"] = password
-        return await super().update(db, db_obj=db_obj, obj_in=update_data)
+        db_obj = await super().update(db, db_obj=db_obj, obj_in=update_data)
+        # Drop the cached principal when authorization-relevant fields change
+        if update_data.keys() & {"email", "role", "is_active"}:
+            await principal_cache.delete(db_obj.id)
+        return db_obj
 
     async def authenticate(
         self, db: AsyncSession, *, email: str, password: str
@@ -44,7 +51,7 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
         user = await self.get_by_email(db, email=email)
         if not user:
             return None
-        if not verify_password(password, user.password):
+        if not await verify_password_async(password, user.password):
             return None
         return user
 
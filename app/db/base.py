@@ -12,6 +12,8 @@ Base = declarative_base()
 
 class BaseModel(Base):
     __abstract__ = True
+    # Fetch ids and generated timestamps with RETURNING on flush instead of a refresh
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
     created_at = Column(DateTime, default=func.now(), nullable=False)
@@ -26,7 +28,10 @@ async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False
 
 
 async def get_db() -> AsyncSession:
-    """Dependency for getting async database session"""
+    """
+    Dependency for getting async database session. Writes are committed by
+    save_changes, once per CRUD call or once per UnitOfWork block.
+    """
     async with async_session() as session:
         try:
             yield session
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey
+from sqlalchemy import Column, Integer, ForeignKey, UniqueConstraint
 from sqlalchemy.orm import relationship
 
 from app.db.base import BaseModel
@@ -25,5 +25,9 @@ class CartItem(BaseModel):
     cart = relationship("Cart", back_populates="items")
     product = relationship("Product", back_populates="cart_items")
 
+    __table_args__ = (
+        UniqueConstraint("cart_id", "product_id", name="uq_cart_items_cart_product"),
+    )
+
     def __repr__(self):
         return f"<CartItem {self.product_id} in cart {self.cart_id}>"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Text, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, Text, ForeignKey, Boolean, Index, text
 from sqlalchemy.orm import relationship
 
 from app.db.base import BaseModel
@@ -26,5 +26,12 @@ class ChatMessage(BaseModel):
 
     session = relationship("ChatSession", back_populates="messages")
 
+    __table_args__ = (
+        # History is read per session in (created_at, id) order, in both directions
+        Index("ix_chat_messages_session_created", "session_id", "created_at", "id"),
+        # Unread counters only ever scan the (few) unread rows of a session
+        Index("ix_chat_messages_session_unread", "session_id", postgresql_where=text("NOT is_read")),
+    )
+
     def __repr__(self):
         return f"<ChatMessage {self.id} in session {self.session_id}>"
@@ -1,5 +1,6 @@
-from sqlalchemy import Boolean, Column, String, Float, Text, Integer, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Boolean, Column, String, Float, Text, Integer, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred, relationship
 
 from app.db.base import BaseModel
 
@@ -27,10 +28,22 @@ class Product(BaseModel):
     image_url = Column(String, nullable=True)
     is_available = Column(Boolean, default=True, nullable=False)
     category_id = Column(Integer, ForeignKey("categories.id"), nullable=False)
+    # Weighted name, category name and description; maintained by CRUDProduct
+    search_vector = deferred(Column(TSVECTOR, nullable=True))
 
     category = relationship("Category", back_populates="products")
     cart_items = relationship("CartItem", back_populates="product", cascade="all, delete-orphan")
     order_items = relationship("OrderItem", back_populates="product")
 
+    __table_args__ = (
+        Index("ix_products_search_vector", "search_vector", postgresql_using="gin"),
+        Index(
+            "ix_products_name_trgm",
+            "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"}
+        ),
+    )
+
     def __repr__(self):
         return f"<Product {self.name}>"
@@ -1,20 +1,31 @@
-from fastapi import FastAPI, WebSocket, Depends
+from fastapi import FastAPI, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+from typing import Optional
+from sqlalchemy import text
 
 from app.core.config import settings
+from app.core.security import password_hasher
 from app.api.v1.api import api_router
-from app.db.base import Base, engine, get_db
-from app.websockets.chat import websocket_endpoint
+from app.db.base import Base, engine
+from app.websockets.chat import manager, websocket_endpoint
+from app.websockets.staff import staff_websocket_endpoint
+from app.websockets.writer import chat_writer
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     async with engine.begin() as conn:
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
         await conn.run_sync(Base.metadata.create_all)
+    await manager.start()
+    await chat_writer.start()
 
     yield
 
+    await chat_writer.stop()
+    await manager.stop()
+    password_hasher.shutdown()
     await engine.dispose()
 
 
@@ -41,15 +52,15 @@ if settings.BACKEND_CORS_ORIGINS:
 # Include API routes
 app.include_router(api_router, prefix=settings.API_PREFIX)
 
-# Add WebSocket route for chat
+# Add WebSocket routes for chat
+@app.websocket("/ws/chat/staff")
+async def staff_chat_websocket(websocket: WebSocket, token: str):
+    await staff_websocket_endpoint(websocket, token)
+
+
 @app.websocket("/ws/chat/{session_id}")
-async def chat_websocket(
-    websocket: WebSocket,
-    session_id: int,
-    token: str,
-    db = Depends(get_db)
-):
-    await websocket_endpoint(websocket, session_id, token, db)
+async def chat_websocket(websocket: WebSocket, session_id: int, token: str, resume: Optional[str] = None):
+    await websocket_endpoint(websocket, session_id, token, resume)
 
 
 @app.get("/")
@@ -1,16 +1,18 @@
-from app.schemas.auth import Token, TokenPayload, User, UserCreate, UserUpdate, UserVerify
+from app.schemas.auth import Principal, Token, TokenPayload, User, UserCreate, UserUpdate, UserVerify
 from app.schemas.product import (
-    Product, ProductCreate, ProductUpdate,
+    Product, ProductCreate, ProductUpdate, ProductSuggestion,
     Category, CategoryCreate, CategoryUpdate
 )
-from app.schemas.cart import Cart, CartItem, CartItemCreate, CartItemUpdate
+from app.schemas.cart import (
+    Cart, CartItem, CartItemCreate, CartItemUpdate, CartItemWithProduct, CartOperation, CartBatch
+)
 from app.schemas.order import (
     Order, OrderCreate, OrderUpdate,
     OrderItem, OrderItemCreate, OrderItemUpdate
 )
 from app.schemas.chat import (
-    ChatSession, ChatSessionCreate,
-    ChatMessage, ChatMessageCreate, ChatMessageUpdate, WebSocketMessage
+    ChatSession, ChatSessionCreate, ChatSessionOverview,
+    ChatMessage, ChatMessageCreate, ChatMessageUpdate, ChatHistory, StaffAction, WebSocketMessage
 )
 from app.schemas.info import (
     CoffeeShopLocation, CoffeeShopLocationCreate, CoffeeShopLocationUpdate,
@@ -19,18 +21,19 @@ from app.schemas.info import (
 
 __all__ = [
     # Auth
-    "Token", "TokenPayload", "User", "UserCreate", "UserUpdate", "UserVerify",
+    "Principal", "Token", "TokenPayload", "User", "UserCreate", "UserUpdate", "UserVerify",
     # Product
-    "Product", "ProductCreate", "ProductUpdate",
+    "Product", "ProductCreate", "ProductUpdate", "ProductSuggestion",
     "Category", "CategoryCreate", "CategoryUpdate",
     # Cart
-    "Cart", "CartItem", "CartItemCreate", "CartItemUpdate",
+    "Cart", "CartItem", "CartItemCreate", "CartItemUpdate", "CartItemWithProduct",
+    "CartOperation", "CartBatch",
     # Order
     "Order", "OrderCreate", "OrderUpdate",
     "OrderItem", "OrderItemCreate", "OrderItemUpdate",
     # Chat
-    "ChatSession", "ChatSessionCreate",
-    "ChatMessage", "ChatMessageCreate", "ChatMessageUpdate",
+    "ChatSession", "ChatSessionCreate", "ChatSessionOverview",
+    "ChatMessage", "ChatMessageCreate", "ChatMessageUpdate", "ChatHistory", "StaffAction",
     # Info
     "CoffeeShopLocation", "CoffeeShopLocationCreate", "CoffeeShopLocationUpdate",
     "StaticInfo", "StaticInfoCreate", "StaticInfoUpdate", "CompanyInfo"
@@ -15,6 +15,17 @@ class TokenPayload(BaseModel):
     type: str
 
 
+class Principal(BaseModel):
+    """Authorization-relevant fields of the authenticated user"""
+    id: int
+    email: str
+    role: str
+    is_active: bool
+
+    class Config:
+        from_attributes = True
+
+
 class UserBase(BaseModel):
     email: EmailStr
     first_name: Optional[str] = None
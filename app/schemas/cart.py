@@ -1,4 +1,4 @@
-from typing import Optional, List
+from typing import Literal, Optional, List
 from pydantic import BaseModel, Field, validator
 from datetime import datetime
 
@@ -28,12 +28,30 @@ class CartItemUpdate(BaseModel):
         return v
 
 
+class CartOperation(BaseModel):
+    """Add to, set or remove the quantity of a product in the cart"""
+    op: Literal["add", "set", "remove"]
+    product_id: int
+    quantity: Optional[int] = Field(None, gt=0)
+
+    @validator("quantity", always=True)
+    def quantity_required_unless_removing(cls, v, values):
+        if v is None and values.get("op") != "remove":
+            raise ValueError("Quantity is required to add or set a product")
+        return v
+
+
+class CartBatch(BaseModel):
+    operations: List[CartOperation] = Field(..., min_length=1, max_length=100)
+
+
 class CartItem(CartItemBase):
+    """Cart item; carts kept outside Postgres have no cart id or timestamps"""
     id: int
-    cart_id: int
+    cart_id: Optional[int] = None
     price: float
-    created_at: datetime
-    updated_at: datetime
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
@@ -61,5 +79,10 @@ class CartInDB(CartBase):
         from_attributes = True
 
 
-class Cart(CartInDB):
+class Cart(CartBase):
+    """Cart view; id and timestamps are empty until the user's cart is created"""
+    id: Optional[int] = None
+    user_id: int
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
     items: List[CartItemWithProduct] = []
@@ -1,13 +1,20 @@
-from typing import Optional, List
-from pydantic import BaseModel
+from typing import Literal, Optional, List
+from pydantic import BaseModel, Field, validator
 from datetime import datetime
 
 
+MAX_MESSAGE_LENGTH = 4000
+
+
 class WebSocketMessage(BaseModel):
     """Schema for WebSocket messages"""
+    type: str = "message"
     session_id: int
     content: str
     sender: str
+    sender_id: Optional[int] = None
+    message_id: Optional[int] = None
+    cursor: Optional[str] = None
     timestamp: datetime = None
 
 
@@ -19,7 +26,27 @@ class ChatMessageBase(BaseModel):
 
 
 class ChatMessageCreate(BaseModel):
-    content: str
+    content: str = Field(..., min_length=1, max_length=MAX_MESSAGE_LENGTH)
+
+
+class StaffAction(BaseModel):
+    """Action sent over the staff chat socket"""
+    action: Literal["subscribe", "unsubscribe", "message", "read", "typing"]
+    session_ids: Optional[List[int]] = Field(None, max_length=500)
+    session_id: Optional[int] = None
+    content: Optional[str] = Field(None, min_length=1, max_length=MAX_MESSAGE_LENGTH)
+
+    @validator("session_id", always=True)
+    def session_id_required_for_session_actions(cls, v, values):
+        if v is None and values.get("action") in ("message", "read", "typing"):
+            raise ValueError("session_id is required")
+        return v
+
+    @validator("content", always=True)
+    def content_required_for_messages(cls, v, values):
+        if v is None and values.get("action") == "message":
+            raise ValueError("content is required")
+        return v
 
 
 class ChatMessageUpdate(BaseModel):
@@ -39,6 +66,13 @@ class ChatMessage(ChatMessageInDB):
     pass
 
 
+class ChatHistory(BaseModel):
+    """Page of chat messages, newest first"""
+    items: List[ChatMessage]
+    before: Optional[str] = None
+    after: Optional[str] = None
+
+
 class ChatSessionBase(BaseModel):
     user_id: int
     is_active: bool = True
@@ -63,3 +97,8 @@ class ChatSessionInDB(ChatSessionBase):
 
 class ChatSession(ChatSessionInDB):
     messages: List[ChatMessage] = []
+
+
+class ChatSessionOverview(ChatSessionInDB):
+    messages: List[ChatMessage] = []
+    unread_count: int = 0
@@ -61,3 +61,11 @@ class Product(ProductBase):
 
 class ProductWithCategory(Product):
     category: Category
+
+
+class ProductSuggestion(BaseModel):
+    id: int
+    name: str
+
+    class Config:
+        from_attributes = True
@@ -3,6 +3,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.security import create_access_token, create_refresh_token, decode_token
 from app.crud import user
+from app.crud.base import save_changes
 from app.schemas import Token, User, UserCreate, UserVerify
 
 
@@ -45,7 +46,7 @@ class AuthService:
         db_user.verification_code = None
         db_user.verification_code_expires = None
         self.db.add(db_user)
-        await self.db.commit()
+        await save_changes(self.db)
         return True
 
     async def refresh_token(self, refresh_token: str) -> Token:
@@ -1,7 +1,20 @@
+from typing import Dict, List, Set, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.cache import TieredCache
+from app.core.config import settings
 from app.crud import cart, cart_item, product
-from app.schemas import Cart, CartItem, CartItemCreate, CartItemUpdate, Product
+from app.crud.base import UnitOfWork, save_changes
+from app.services.cart_store import CartStore, cart_store
+from app.schemas import Cart, CartItem, CartItemCreate, CartItemUpdate, CartItemWithProduct, CartOperation, Product
+
+
+# User id -> the user's cart view, invalidated by every cart write, by checkout and
+# by product writes. Only used with the shared Redis tier, so that an invalidation
+# made on one worker is seen by all of them.
+cart_cache = TieredCache(
+    "cart", maxsize=settings.CART_CACHE_MAX_SIZE, ttl=settings.CART_CACHE_TTL_SECONDS, unshared_ttl=0
+)
 
 
 class CartService:
@@ -9,76 +22,110 @@ class CartService:
         self.db = db
 
     async def get_user_cart(self, user_id: int) -> Cart:
-        """Gets or creates a cart for the user"""
-        db_cart = await cart.get_or_create(self.db, user_id=user_id)
-
-        cart_items = await cart_item.get_by_cart(self.db, cart_id=db_cart.id)
-        cart_items_with_products = []
-
-        for item in cart_items:
-            db_product = await product.get(self.db, id=item.product_id)
-            if db_product and db_product.is_available:
-                product_data = Product.from_orm(db_product)
-                cart_item_data = CartItem.from_orm(item)
-                cart_items_with_products.append({
-                    **cart_item_data.dict(),
-                    "product": product_data
-                })
-
-        return Cart(
-            id=db_cart.id,
-            user_id=db_cart.user_id,
-            created_at=db_cart.created_at,
-            updated_at=db_cart.updated_at,
-            items=cart_items_with_products
-        )
+        """Gets the user's cart; read-only, an empty cart is returned if the user has none"""
+        cached = await cart_cache.get(user_id)
+        if cached is not None:
+            return Cart(**cached)
 
-    async def add_item(self, user_id: int, item_in: CartItemCreate) -> CartItem:
-        """Adds a product to the cart"""
-        # Check product existence
-        db_product = await product.get(self.db, id=item_in.product_id)
-        if not db_product:
-            raise ValueError("Product not found")
-
-        if not db_product.is_available:
-            raise ValueError("Product unavailable")
-
-        # Get or create cart
-        db_cart = await cart.get_or_create(self.db, user_id=user_id)
-
-        # Check if the product is already in the cart
-        existing_item = await cart_item.get_by_cart_and_product(
-            self.db,
-            cart_id=db_cart.id,
-            product_id=item_in.product_id
-        )
+        user_cart = await self._load_cart(user_id)
+        await cart_cache.set(user_id, user_cart)
+        return user_cart
 
-        if existing_item:
-            # Update quantity
-            new_quantity = existing_item.quantity + item_in.quantity
-            updated_item = await cart_item.update_quantity(
-                self.db, 
-                cart_item=existing_item, 
-                quantity=new_quantity
-            )
-            return CartItem.from_orm(updated_item)
+    async def _load_cart(self, user_id: int) -> Cart:
+        db_cart = await cart.get_with_items(self.db, user_id=user_id)
+        if not db_cart:
+            return Cart(user_id=user_id)
         else:
-            # Create a new product in the cart
-            item_data = CartItemCreate(
-                product_id=item_in.product_id,
-                quantity=item_in.quantity
+            items = [
+                CartItemWithProduct(
+                    id=item.id,
+                    cart_id=item.cart_id,
+                    product_id=item.product_id,
+                    quantity=item.quantity,
+                    price=item.product.price,
+                    created_at=item.created_at,
+                    updated_at=item.updated_at,
+                    product=Product.from_orm(item.product)
+                )
+                for item in db_cart.items
+                if item.product.is_available
+            ]
+            return Cart(
+                id=db_cart.id,
+                user_id=db_cart.user_id,
+                total_amount=sum(item.price * item.quantity for item in items),
+                created_at=db_cart.created_at,
+                updated_at=db_cart.updated_at,
+                items=items
             )
 
-            new_cart_item = await cart_item.create(
+    async def add_item(self, user_id: int, item_in: CartItemCreate) -> CartItem:
+        """Adds a product to the cart, or increases its quantity if it is already there"""
+        async with UnitOfWork(self.db):
+            row = await cart_item.add_or_increment(
                 self.db,
-                obj_in=CartItemCreate(
-                    cart_id=db_cart.id,
-                    product_id=item_data.product_id,
-                    quantity=item_data.quantity
-                )
+                user_id=user_id,
+                product_id=item_in.product_id,
+                quantity=item_in.quantity
             )
+            if row is None:
+                # Nothing was inserted: tell why, the unit of work undoes the cart upsert
+                db_product = await product.get(self.db, id=item_in.product_id)
+                raise ValueError("Product unavailable" if db_product else "Product not found")
+        await cart_cache.delete(user_id)
+
+        db_cart_item, price = row
+        return CartItem(
+            id=db_cart_item.id,
+            cart_id=db_cart_item.cart_id,
+            product_id=db_cart_item.product_id,
+            quantity=db_cart_item.quantity,
+            price=price,
+            created_at=db_cart_item.created_at,
+            updated_at=db_cart_item.updated_at
+        )
+
+    @staticmethod
+    def _fold_operations(operations: List[CartOperation]) -> Tuple[Dict[int, int], Dict[int, int], Set[int]]:
+        """Folds the operations into quantities to add, quantities to set and products to remove"""
+        adds: Dict[int, int] = {}
+        sets: Dict[int, int] = {}
+        removes: Set[int] = set()
+        for operation in operations:
+            product_id = operation.product_id
+            if operation.op == "remove":
+                adds.pop(product_id, None)
+                sets.pop(product_id, None)
+                removes.add(product_id)
+            elif operation.op == "set" or product_id in sets or product_id in removes:
+                # Adding after a set or a removal is a set to the summed quantity
+                base = sets.get(product_id, 0) if operation.op == "add" else 0
+                adds.pop(product_id, None)
+                removes.discard(product_id)
+                sets[product_id] = base + operation.quantity
+            else:
+                adds[product_id] = adds.get(product_id, 0) + operation.quantity
+        return adds, sets, removes
 
-            return CartItem.from_orm(new_cart_item)
+    async def apply_operations(self, user_id: int, operations: List[CartOperation]) -> Cart:
+        """
+        Applies add/set/remove operations to the cart in one transaction. The
+        operations are first folded into one final change per product, which
+        then takes one statement per kind of change.
+        """
+        adds, sets, removes = self._fold_operations(operations)
+
+        async with UnitOfWork(self.db):
+            cart_id = await cart.upsert(self.db, user_id=user_id)
+            await cart_item.remove_products(self.db, cart_id=cart_id, product_ids=list(removes))
+            written = await cart_item.upsert_many(self.db, cart_id=cart_id, quantities=adds, increment=True)
+            written += await cart_item.upsert_many(self.db, cart_id=cart_id, quantities=sets, increment=False)
+
+            skipped = sorted((set(adds) | set(sets)) - set(written))
+            if skipped:
+                raise ValueError(f"Products not found or unavailable: {', '.join(map(str, skipped))}")
+        await cart_cache.delete(user_id)
+        return await self.get_user_cart(user_id)
 
     async def update_item(self, user_id: int, item_id: int, item_in: CartItemUpdate) -> CartItem:
         """Updates the quantity of a product in the cart"""
@@ -98,6 +145,7 @@ class CartService:
             cart_item=db_cart_item,
             quantity=item_in.quantity
         )
+        await cart_cache.delete(user_id)
 
         return CartItem.from_orm(updated_item)
 
@@ -115,6 +163,7 @@ class CartService:
 
         # Remove item
         await cart_item.remove(self.db, id=item_id)
+        await cart_cache.delete(user_id)
         return True
 
     async def clear_cart(self, user_id: int) -> bool:
@@ -126,4 +175,93 @@ class CartService:
 
         # Remove all items from the cart
         await cart_item.remove_by_cart(self.db, cart_id=db_cart.id)
+        await save_changes(self.db)
+        await cart_cache.delete(user_id)
         return True
+
+
+class StoredCartService(CartService):
+    """
+    Cart service over a CartStore (CART_STORAGE_BACKEND), which keeps cart
+    writes off Postgres; the cart is only read from the store at checkout.
+    Cart item ids are the product ids.
+    """
+
+    def __init__(self, db: AsyncSession, store: CartStore):
+        super().__init__(db)
+        self.store = store
+
+    async def _load_cart(self, user_id: int) -> Cart:
+        quantities = await self.store.get(user_id)
+        db_products = await product.get_by_ids(self.db, ids=list(quantities)) if quantities else []
+        items = [
+            CartItemWithProduct(
+                id=db_product.id,
+                product_id=db_product.id,
+                quantity=quantities[db_product.id],
+                price=db_product.price,
+                product=Product.from_orm(db_product)
+            )
+            for db_product in db_products
+            if db_product.is_available
+        ]
+        return Cart(
+            user_id=user_id,
+            total_amount=sum(item.price * item.quantity for item in items),
+            items=items
+        )
+
+    async def _get_available_product(self, product_id: int):
+        db_product = await product.get(self.db, id=product_id)
+        if not db_product:
+            raise ValueError("Product not found")
+        if not db_product.is_available:
+            raise ValueError("Product unavailable")
+        return db_product
+
+    async def add_item(self, user_id: int, item_in: CartItemCreate) -> CartItem:
+        db_product = await self._get_available_product(item_in.product_id)
+        quantity = await self.store.add(user_id, item_in.product_id, item_in.quantity)
+        await cart_cache.delete(user_id)
+        return CartItem(id=db_product.id, product_id=db_product.id, quantity=quantity, price=db_product.price)
+
+    async def apply_operations(self, user_id: int, operations: List[CartOperation]) -> Cart:
+        adds, sets, removes = self._fold_operations(operations)
+
+        product_ids = set(adds) | set(sets)
+        db_products = await product.get_by_ids(self.db, ids=list(product_ids)) if product_ids else []
+        skipped = sorted(product_ids - {p.id for p in db_products if p.is_available})
+        if skipped:
+            raise ValueError(f"Products not found or unavailable: {', '.join(map(str, skipped))}")
+
+        await self.store.apply(user_id, adds, sets, removes)
+        await cart_cache.delete(user_id)
+        return await self.get_user_cart(user_id)
+
+    async def update_item(self, user_id: int, item_id: int, item_in: CartItemUpdate) -> CartItem:
+        quantities = await self.store.get(user_id)
+        if item_id not in quantities:
+            raise ValueError("Cart item not found")
+
+        db_product = await self._get_available_product(item_id)
+        await self.store.set(user_id, item_id, item_in.quantity)
+        await cart_cache.delete(user_id)
+        return CartItem(id=item_id, product_id=item_id, quantity=item_in.quantity, price=db_product.price)
+
+    async def remove_item(self, user_id: int, item_id: int) -> bool:
+        if not await self.store.remove(user_id, item_id):
+            raise ValueError("Cart item not found")
+        await cart_cache.delete(user_id)
+        return True
+
+    async def clear_cart(self, user_id: int) -> bool:
+        await self.store.clear(user_id)
+        await cart_cache.delete(user_id)
+        return True
+
+
+def get_cart_service(db: AsyncSession) -> CartService:
+    """Cart service for the configured CART_STORAGE_BACKEND"""
+    if cart_store is not None:
+        return StoredCartService(db, cart_store)
+    return CartService(db)
@@ -0,0 +1,145 @@
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, Optional
+
+from app.core.config import settings
+
+
+class CartStore(ABC):
+    """
+    Ephemeral storage for carts: the quantity of each product in a user's
+    cart. Carts kept in a store never touch Postgres until checkout.
+    """
+
+    @abstractmethod
+    async def get(self, user_id: int) -> Dict[int, int]:
+        """Gets the quantity of each product in the cart"""
+
+    @abstractmethod
+    async def add(self, user_id: int, product_id: int, quantity: int) -> int:
+        """Adds to the product's quantity and returns the new quantity"""
+
+    @abstractmethod
+    async def set(self, user_id: int, product_id: int, quantity: int) -> None:
+        """Sets the product's quantity"""
+
+    @abstractmethod
+    async def remove(self, user_id: int, product_id: int) -> bool:
+        """Removes the product; returns False if it was not in the cart"""
+
+    @abstractmethod
+    async def clear(self, user_id: int) -> None:
+        """Empties the cart"""
+
+    @abstractmethod
+    async def apply(
+        self, user_id: int, adds: Dict[int, int], sets: Dict[int, int], removes: Iterable[int]
+    ) -> None:
+        """Applies folded batch operations to the cart at once"""
+
+
+class InMemoryCartStore(CartStore):
+    """Single-process store, used in development and tests"""
+
+    def __init__(self):
+        self.carts: Dict[int, Dict[int, int]] = {}
+
+    async def get(self, user_id: int) -> Dict[int, int]:
+        return dict(self.carts.get(user_id, {}))
+
+    async def add(self, user_id: int, product_id: int, quantity: int) -> int:
+        items = self.carts.setdefault(user_id, {})
+        items[product_id] = items.get(product_id, 0) + quantity
+        return items[product_id]
+
+    async def set(self, user_id: int, product_id: int, quantity: int) -> None:
+        self.carts.setdefault(user_id, {})[product_id] = quantity
+
+    async def remove(self, user_id: int, product_id: int) -> bool:
+        return self.carts.get(user_id, {}).pop(product_id, None) is not None
+
+    async def clear(self, user_id: int) -> None:
+        self.carts.pop(user_id, None)
+
+    async def apply(
+        self, user_id: int, adds: Dict[int, int], sets: Dict[int, int], removes: Iterable[int]
+    ) -> None:
+        items = self.carts.setdefault(user_id, {})
+        for product_id in removes:
+            items.pop(product_id, None)
+        for product_id, quantity in adds.items():
+            items[product_id] = items.get(product_id, 0) + quantity
+        items.update(sets)
+
+
+class RedisCartStore(CartStore):
+    """
+    Carts as Redis hashes of product id -> quantity. Every write extends the
+    cart's expiry by `ttl` seconds, so abandoned carts clean themselves up.
+    """
+
+    def __init__(self, url: str, ttl: int):
+        self.url = url
+        self.ttl = ttl
+        self._redis = None
+
+    def _get_redis(self):
+        if self._redis is None:
+            import redis.asyncio as redis
+
+            self._redis = redis.from_url(self.url, decode_responses=True)
+        return self._redis
+
+    def _key(self, user_id: int) -> str:
+        return f"cart:{user_id}"
+
+    async def get(self, user_id: int) -> Dict[int, int]:
+        items = await self._get_redis().hgetall(self._key(user_id))
+        return {int(product_id): int(quantity) for product_id, quantity in items.items()}
+
+    async def add(self, user_id: int, product_id: int, quantity: int) -> int:
+        key = self._key(user_id)
+        async with self._get_redis().pipeline(transaction=True) as pipe:
+            pipe.hincrby(key, product_id, quantity)
+            pipe.expire(key, self.ttl)
+            new_quantity, _ = await pipe.execute()
+        return new_quantity
+
+    async def set(self, user_id: int, product_id: int, quantity: int) -> None:
+        key = self._key(user_id)
+        async with self._get_redis().pipeline(transaction=True) as pipe:
+            pipe.hset(key, product_id, quantity)
+            pipe.expire(key, self.ttl)
+            await pipe.execute()
+
+    async def remove(self, user_id: int, product_id: int) -> bool:
+        return bool(await self._get_redis().hdel(self._key(user_id), product_id))
+
+    async def clear(self, user_id: int) -> None:
+        await self._get_redis().delete(self._key(user_id))
+
+    async def apply(
+        self, user_id: int, adds: Dict[int, int], sets: Dict[int, int], removes: Iterable[int]
+    ) -> None:
+        key = self._key(user_id)
+        removes = list(removes)
+        async with self._get_redis().pipeline(transaction=True) as pipe:
+            if removes:
+                pipe.hdel(key, *removes)
+            for product_id, quantity in adds.items():
+                pipe.hincrby(key, product_id, quantity)
+            if sets:
+                pipe.hset(key, mapping=sets)
+            pipe.expire(key, self.ttl)
+            await pipe.execute()
+
+
+def create_cart_store() -> Optional[CartStore]:
+    """Store selected by CART_STORAGE_BACKEND; None keeps carts in Postgres"""
+    if settings.CART_STORAGE_BACKEND == "redis":
+        return RedisCartStore(settings.CART_REDIS_URL, ttl=settings.CART_TTL_SECONDS)
+    if settings.CART_STORAGE_BACKEND == "memory":
+        return InMemoryCartStore()
+    return None
+
+
+cart_store = create_cart_store()
@@ -1,8 +1,24 @@
-from typing import List
+from typing import Dict, List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.cache import TieredCache
+from app.core.config import settings
 from app.crud import chat_session, chat_message
-from app.schemas import ChatSession, ChatSessionCreate, ChatMessage, ChatMessageCreate, ChatMessageUpdate
+from app.crud.base import save_changes
+from app.schemas import ChatSession, ChatSessionCreate, ChatSessionOverview, ChatMessage, ChatMessageCreate, ChatMessageUpdate, ChatHistory
+
+
+# User id -> id of the user's active chat session, invalidated by close_session.
+# Without the shared Redis tier other workers only see that invalidation once
+# their entry expires, so it is kept for a few seconds at most; writes check
+# that the session is still active anyway.
+active_session_cache = TieredCache(
+    "chat_session",
+    maxsize=settings.CHAT_SESSION_CACHE_MAX_SIZE,
+    ttl=settings.CHAT_SESSION_CACHE_TTL_SECONDS,
+    unshared_ttl=settings.CACHE_LOCAL_TTL_SECONDS
+)
+
 
 class ChatService:
     def __init__(self, db: AsyncSession):
@@ -29,10 +45,29 @@ class ChatService:
             messages=messages_data
         )
 
+    async def resolve_session_id(self, user_id: int, create: bool = True) -> Optional[int]:
+        """Gets the id of the user's active chat session without loading its messages"""
+        session_id = await active_session_cache.get(user_id)
+        if session_id is not None:
+            return session_id
+
+        db_session = await chat_session.get_by_user(self.db, user_id=user_id)
+        if not db_session:
+            if not create:
+                return None
+            db_session = await chat_session.create(self.db, obj_in=ChatSessionCreate(user_id=user_id))
+
+        await active_session_cache.set(user_id, db_session.id)
+        return db_session.id
+
     async def add_message(self, user_id: int, message_text: str) -> ChatMessage:
         """Adds a new message from the user to the chat"""
-        # Gets or creates a chat session
-        session = await self.get_or_create_session(user_id)
+        # Gets or creates a chat session; a cached session closed meanwhile is replaced
+        session_id = await self.resolve_session_id(user_id)
+        db_session = await chat_session.get(self.db, id=session_id)
+        if not db_session or not db_session.is_active:
+            await active_session_cache.delete(user_id)
+            session_id = await self.resolve_session_id(user_id)
 
         # Creates a new message
         message_data = ChatMessageCreate(content=message_text)
@@ -41,7 +76,7 @@ class ChatService:
             obj_in={
                 "content": message_data.content,
                 "sender_id": user_id,
-                "session_id": session.id,
+                "session_id": session_id,
                 "is_read": False
             }
         )
@@ -54,6 +89,8 @@ class ChatService:
         db_session = await chat_session.get(self.db, id=session_id)
         if not db_session:
             raise ValueError("Chat session not found")
+        if not db_session.is_active:
+            raise ValueError("Chat session is closed")
 
         # Creates a new message
         message_data = ChatMessageCreate(content=message_text)
@@ -69,27 +106,44 @@ class ChatService:
 
         return ChatMessage.from_orm(db_message)
 
-    async def get_messages(self, session_id: int, skip: int = 0, limit: int = 100) -> List[ChatMessage]:
-        """Gets the list of messages for the chat session"""
-        db_messages = await chat_message.get_by_session(
+    async def get_messages(
+        self,
+        session_id: int,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+        limit: int = 100
+    ) -> ChatHistory:
+        """Gets a page of messages for the chat session, newest first"""
+        if before and after:
+            raise ValueError("Only one of before and after can be given")
+
+        db_messages, before_cursor, after_cursor = await chat_message.get_history(
             self.db,
             session_id=session_id,
-            skip=skip,
+            before=before,
+            after=after,
             limit=limit
         )
 
-        return [ChatMessage.from_orm(m) for m in db_messages]
+        return ChatHistory(
+            items=[ChatMessage.from_orm(m) for m in db_messages],
+            before=before_cursor,
+            after=after_cursor
+        )
 
-    async def mark_messages_as_read(self, session_id: int, user_id: int) -> bool:
-        """Marks messages as read"""
-        await chat_message.mark_as_read(self.db, session_id=session_id, sender_id=user_id)
-        return True
+    async def mark_messages_as_read(self, session_id: int, user_id: int) -> List[int]:
+        """Marks messages as read and returns their ids"""
+        return await chat_message.mark_as_read(self.db, session_id=session_id, sender_id=user_id)
 
     async def get_unread_count(self, session_id: int, user_id: int) -> int:
         """Gets the count of unread messages for the user"""
-        # Gets unread messages not from the current user
-        messages = await chat_message.get_unread(self.db, session_id=session_id)
-        return len([m for m in messages if m.sender_id != user_id])
+        return await chat_message.count_unread(self.db, session_id=session_id, exclude_sender_id=user_id)
+
+    async def get_unread_counts(self, session_ids: List[int], user_id: int) -> Dict[int, int]:
+        """Gets the count of unread messages for the user in each of the sessions"""
+        return await chat_message.count_unread_by_session(
+            self.db, session_ids=session_ids, exclude_sender_id=user_id
+        )
 
     async def close_session(self, session_id: int) -> bool:
         """Closes the chat session"""
@@ -99,26 +153,31 @@ class ChatService:
 
         db_session.is_active = False
         self.db.add(db_session)
-        await self.db.commit()
+        await save_changes(self.db)
+        await active_session_cache.delete(db_session.user_id)
         return True
 
-    async def get_active_sessions(self, skip: int = 0, limit: int = 100) -> List[ChatSession]:
-        """Gets the list of active chat sessions (for administrators)"""
-        db_sessions = await chat_session.get_active(self.db)
-
-        result = []
-        for session in db_sessions:
-            # Gets messages for the session
-            messages = await chat_message.get_by_session(
-                self.db, 
-                session_id=session.id,
-                skip=0,
-                limit=10  # Gets only the last 10 messages
-            )
-            messages_data = [ChatMessage.from_orm(m) for m in messages]
-
-            session_data = ChatSession.from_orm(session)
-            session_data.messages = messages_data
-            result.append(session_data)
+    async def get_active_sessions(
+        self, viewer_id: int, cursor: Optional[str] = None, limit: int = 100, messages_limit: int = 10
+    ) -> Tuple[List[ChatSessionOverview], Optional[str]]:
+        """Gets a page of active chat sessions with their latest messages and unread counts (for staff)"""
+        rows, next_cursor = await chat_session.get_active_overview(
+            self.db,
+            viewer_id=viewer_id,
+            cursor=cursor,
+            limit=limit,
+            messages_limit=messages_limit
+        )
 
-        return result
+        return [
+            ChatSessionOverview(
+                id=db_session.id,
+                user_id=db_session.user_id,
+                is_active=db_session.is_active,
+                created_at=db_session.created_at,
+                updated_at=db_session.updated_at,
+                messages=[ChatMessage.from_orm(m) for m in messages],
+                unread_count=unread_count
+            )
+            for db_session, unread_count, messages in rows
+        ], next_cursor
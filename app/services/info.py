@@ -1,6 +1,12 @@
-from typing import Dict, List, Optional
+import asyncio
+import hashlib
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi.encoders import jsonable_encoder
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import settings
 from app.crud import coffee_shop_location, static_info
 from app.schemas import (
     CoffeeShopLocation, CoffeeShopLocationCreate, CoffeeShopLocationUpdate,
@@ -8,6 +14,51 @@ from app.schemas import (
 )
 
 
+class InfoSnapshot:
+    """
+    Pre-rendered JSON documents of the company info, static info and active
+    locations, each with an ETag derived from its content. The snapshot is
+    rebuilt after any write to static info or locations, and at least every
+    `ttl` seconds so that writes made through other workers show up too.
+    `version` counts invalidations, so that a rebuild which raced with a
+    write is not taken as fresh.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.version = 0
+        self.documents: Dict[str, Tuple[bytes, str]] = {}
+        self._built_at: Optional[float] = None
+        self.lock = asyncio.Lock()
+
+    def is_fresh(self) -> bool:
+        return self._built_at is not None and time.monotonic() - self._built_at < self.ttl
+
+    def invalidate(self) -> None:
+        self.version += 1
+        self._built_at = None
+
+    def update(self, documents: Dict[str, Any], version: Optional[int] = None) -> None:
+        """
+        Publishes documents read at `version`; they are only marked fresh if
+        nothing was invalidated since, otherwise the next read rebuilds them
+        """
+        rendered = {}
+        for name, document in documents.items():
+            body = json.dumps(
+                jsonable_encoder(document), ensure_ascii=False, separators=(",", ":")
+            ).encode("utf-8")
+            etag = f'"{hashlib.sha1(body).hexdigest()}"'
+            rendered[name] = (body, etag)
+
+        self.documents = rendered
+        if version is None or version == self.version:
+            self._built_at = time.monotonic()
+
+
+info_snapshot = InfoSnapshot(ttl=settings.INFO_SNAPSHOT_TTL_SECONDS)
+
+
 class InfoService:
     def __init__(self, db: AsyncSession):
         self.db = db
@@ -16,6 +67,7 @@ class InfoService:
     async def create_location(self, location_in: CoffeeShopLocationCreate) -> CoffeeShopLocation:
         """Creates a new coffee shop location"""
         db_location = await coffee_shop_location.create(self.db, obj_in=location_in)
+        info_snapshot.invalidate()
         return CoffeeShopLocation.from_orm(db_location)
 
     async def get_locations(self, city: Optional[str] = None) -> List[CoffeeShopLocation]:
@@ -46,6 +98,7 @@ class InfoService:
         db_location = await coffee_shop_location.update(
             self.db, db_obj=db_location, obj_in=location_in
         )
+        info_snapshot.invalidate()
 
         return CoffeeShopLocation.from_orm(db_location)
 
@@ -58,6 +111,7 @@ class InfoService:
             raise ValueError(f"Record with key '{info_in.key}' already exists")
 
         db_info = await static_info.create(self.db, obj_in=info_in)
+        info_snapshot.invalidate()
         return StaticInfo.from_orm(db_info)
 
     async def get_static_info(self, key: str) -> StaticInfo:
@@ -77,6 +131,7 @@ class InfoService:
             raise ValueError(f"Information with key '{key}' not found")
 
         db_info = await static_info.update(self.db, db_obj=db_info, obj_in=info_in)
+        info_snapshot.invalidate()
         return StaticInfo.from_orm(db_info)
 
     async def get_all_static_info(self) -> Dict[str, str]:
@@ -88,7 +143,32 @@ class InfoService:
         """Gets general information about the company"""
         info_dict = await self.get_all_static_info()
         locations = await self.get_locations()
-
+        return self._company_info(info_dict, locations)
+
+    async def get_snapshot_document(self, name: str) -> Tuple[bytes, str]:
+        """
+        Gets a pre-rendered JSON document ("company", "static" or "locations")
+        and its ETag, rebuilding the snapshot if it is stale
+        """
+        if not info_snapshot.is_fresh():
+            async with info_snapshot.lock:
+                if not info_snapshot.is_fresh():
+                    version = info_snapshot.version
+                    info_dict = await self.get_all_static_info()
+                    locations = await self.get_locations()
+                    info_snapshot.update({
+                        "company": self._company_info(info_dict, locations),
+                        "static": info_dict,
+                        "locations": locations
+                    }, version=version)
+
+        return info_snapshot.documents[name]
+
+    @staticmethod
+    def _company_info(
+        info_dict: Dict[str, str], locations: List[CoffeeShopLocation]
+    ) -> CompanyInfo:
+        """Forms the company information from static information and locations"""
         # Gets company data from static information or uses default values
         name = info_dict.get("company_name", "Coffee Shop")
         description = info_dict.get("company_description", "")
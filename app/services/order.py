@@ -1,9 +1,13 @@
-from typing import List
+from datetime import datetime
+from typing import List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.crud import order, order_item, product, cart, cart_item
+from app.crud import order, product, cart, cart_item
+from app.crud.base import UnitOfWork
 from app.db.models.order import OrderStatus
-from app.schemas import Order, OrderCreate, OrderUpdate, OrderItemCreate
+from app.schemas import Order, OrderUpdate, OrderItemCreate
+from app.services.cart import cart_cache
+from app.services.cart_store import cart_store
 
 
 class OrderService:
@@ -12,130 +16,77 @@ class OrderService:
 
     async def create_order(self, user_id: int, delivery_address: str, contact_phone: str) -> Order:
         """Creates a new order from the user's cart"""
-        # Get the user's cart
-        db_cart = await cart.get_by_user(self.db, user_id=user_id)
-        if not db_cart:
-            raise ValueError("Cart not found")
-
-        # Get the items in the cart
-        cart_items = await cart_item.get_by_cart(self.db, cart_id=db_cart.id)
-        if not cart_items:
+        # Get the quantity of each product in the user's cart
+        db_cart = None
+        if cart_store is not None:
+            quantities = await cart_store.get(user_id)
+        else:
+            db_cart = await cart.get_by_user(self.db, user_id=user_id)
+            if not db_cart:
+                raise ValueError("Cart not found")
+            cart_items = await cart_item.get_by_cart(self.db, cart_id=db_cart.id)
+            quantities = {item.product_id: item.quantity for item in cart_items}
+        if not quantities:
             raise ValueError("Cart is empty")
 
+        # Get all products of the cart with one query for availability and price check
+        db_products = await product.get_by_ids(
+            self.db, ids=list(quantities)
+        )
+        products_by_id = {p.id: p for p in db_products}
+
         # Prepare order items and calculate the total amount
         total_amount = 0
         order_items_data = []
 
-        for item in cart_items:
-            # Get the product for availability and price check
-            db_product = await product.get(self.db, id=item.product_id)
+        for product_id, quantity in quantities.items():
+            db_product = products_by_id.get(product_id)
             if not db_product:
-                raise ValueError(f"Product with ID {item.product_id} not found")
+                raise ValueError(f"Product with ID {product_id} not found")
 
             if not db_product.is_available:
                 raise ValueError(f"Product '{db_product.name}' is unavailable")
 
             # Create an order item
             item_price = db_product.price
-            item_total = item_price * item.quantity
+            item_total = item_price * quantity
             total_amount += item_total
 
             order_items_data.append(OrderItemCreate(
-                product_id=item.product_id,
-                quantity=item.quantity,
+                product_id=product_id,
+                quantity=quantity,
                 price=item_price
-            ))
-
-        # Create the order with items
-        order_data = OrderCreate(
-            user_id=user_id,
-            status=OrderStatus.PENDING,
-            total_amount=total_amount,
-            delivery_address=delivery_address,
-            contact_phone=contact_phone,
-            items=order_items_data
-        )
-
-        # Create the order in the DB
-        db_order = await order.create_with_items(self.db, obj_in=order_data)
-
-        # Clear the cart
-        await cart_item.remove_by_cart(self.db, cart_id=db_cart.id)
+            ).dict())
+
+        order_data = {
+            "user_id": user_id,
+            "status": OrderStatus.PENDING,
+            "total_amount": total_amount,
+            "delivery_address": delivery_address,
+            "contact_phone": contact_phone
+        }
+
+        # Create the order with items and clear the cart in a single transaction
+        async with UnitOfWork(self.db):
+            db_order = await order.create_with_items(
+                self.db, obj_in=order_data, items=order_items_data
+            )
+            if db_cart is not None:
+                await cart_item.remove_by_cart(self.db, cart_id=db_cart.id)
+        # A cart kept outside Postgres is only cleared once the order is stored
+        if cart_store is not None:
+            await cart_store.clear(user_id)
+        await cart_cache.delete(user_id)
 
         # Get the full order data with items
         return await self.get_order(user_id, db_order.id)
 
-    async def get_orders(self, user_id: int, skip: int = 0, limit: int = 100) -> List[Order]:
-        """Gets the list of user's orders"""
-        db_orders = await order.get_by_user(self.db, user_id=user_id, skip=skip, limit=limit)
-
-        result = []
-        for db_order in db_orders:
-            # Get the order items
-            db_order_items = await order_item.get_by_order(self.db, order_id=db_order.id)
-
-            # Form order items with product data
-            order_items_data = []
-            for item in db_order_items:
-                db_product = await product.get(self.db, id=item.product_id)
-                if db_product:
-                    product_data = {
-                        "id": db_product.id,
-                        "name": db_product.name,
-                        "price": db_product.price,
-                        "description": db_product.description,
-                        "image_url": db_product.image_url,
-                        "category_id": db_product.category_id,
-                        "is_available": db_product.is_available,
-                        "created_at": db_product.created_at,
-                        "updated_at": db_product.updated_at
-                    }
-
-                    order_items_data.append({
-                        "id": item.id,
-                        "order_id": item.order_id,
-                        "product_id": item.product_id,
-                        "quantity": item.quantity,
-                        "price": item.price,
-                        "created_at": item.created_at,
-                        "updated_at": item.updated_at,
-                        "product": product_data
-                    })
-
-            # Form the order with items
-            order_data = {
-                "id": db_order.id,
-                "user_id": db_order.user_id,
-                "status": db_order.status,
-                "total_amount": db_order.total_amount,
-                "delivery_address": db_order.delivery_address,
-                "contact_phone": db_order.contact_phone,
-                "created_at": db_order.created_at,
-                "updated_at": db_order.updated_at,
-                "items": order_items_data
-            }
-
-            result.append(order_data)
-
-        return result
-
-    async def get_order(self, user_id: int, order_id: int) -> Order:
-        """Gets the order details"""
-        db_order = await order.get(self.db, id=order_id)
-        if not db_order:
-            raise ValueError("Order not found")
-
-        # Check if the order belongs to the user
-        if db_order.user_id != user_id:
-            raise ValueError("No access to the order")
-
-        # Get the order items
-        db_order_items = await order_item.get_by_order(self.db, order_id=db_order.id)
-
-        # Form order items with product data
+    @staticmethod
+    def _order_data(db_order) -> dict:
+        """Forms the order data with items and product data from an eager-loaded order"""
         order_items_data = []
-        for item in db_order_items:
-            db_product = await product.get(self.db, id=item.product_id)
+        for item in db_order.items:
+            db_product = item.product
             if db_product:
                 product_data = {
                     "id": db_product.id,
@@ -160,18 +111,58 @@ class OrderService:
                     "product": product_data
                 })
 
-        # Form the order with items
-        return Order(
-            id=db_order.id,
-            user_id=db_order.user_id,
-            status=db_order.status,
-            total_amount=db_order.total_amount,
-            delivery_address=db_order.delivery_address,
-            contact_phone=db_order.contact_phone,
-            created_at=db_order.created_at,
-            updated_at=db_order.updated_at,
-            items=order_items_data
+        return {
+            "id": db_order.id,
+            "user_id": db_order.user_id,
+            "status": db_order.status,
+            "total_amount": db_order.total_amount,
+            "delivery_address": db_order.delivery_address,
+            "contact_phone": db_order.contact_phone,
+            "created_at": db_order.created_at,
+            "updated_at": db_order.updated_at,
+            "items": order_items_data
+        }
+
+    async def get_orders(
+        self, user_id: int, cursor: Optional[str] = None, limit: int = 100
+    ) -> Tuple[List[Order], Optional[str]]:
+        """Gets a page of user's orders and the cursor of the next page"""
+        # Orders, items and products are loaded in a fixed number of queries
+        db_orders, next_cursor = await order.get_by_user_with_items(
+            self.db, user_id=user_id, cursor=cursor, limit=limit
+        )
+        return [self._order_data(db_order) for db_order in db_orders], next_cursor
+
+    async def get_order(self, user_id: int, order_id: int) -> Order:
+        """Gets the order details"""
+        db_order = await order.get_with_items(self.db, id=order_id)
+        if not db_order:
+            raise ValueError("Order not found")
+
+        # Check if the order belongs to the user
+        if db_order.user_id != user_id:
+            raise ValueError("No access to the order")
+
+        return Order(**self._order_data(db_order))
+
+    async def get_all_orders(
+        self,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        status: Optional[OrderStatus] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None
+    ) -> Tuple[List[Order], Optional[str]]:
+        """Gets a page of all orders with items (for staff)"""
+        db_orders, next_cursor = await order.get_multi_with_items(
+            self.db,
+            status=status,
+            created_from=created_from,
+            created_to=created_to,
+            cursor=cursor,
+            limit=limit
         )
+        return [self._order_data(db_order) for db_order in db_orders], next_cursor
 
     async def update_order_status(self, order_id: int, status: OrderStatus) -> Order:
         """Updates the order status (for administrators)"""
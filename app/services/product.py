@@ -1,8 +1,24 @@
-from typing import List, Optional
+import json
+from typing import List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.cache import TieredCache
+from app.core.config import settings
 from app.crud import category, product
-from app.schemas import Category, CategoryCreate, Product, ProductCreate, ProductUpdate
+from app.schemas import Category, CategoryCreate, Product, ProductCreate, ProductSuggestion, ProductUpdate
+from app.services.cart import cart_cache
+
+
+# Read-through caches for the catalog, invalidated by the write methods below
+category_list_cache = TieredCache(
+    "categories", maxsize=1, ttl=settings.CATALOG_CACHE_TTL_SECONDS
+)
+product_cache = TieredCache(
+    "product", maxsize=settings.CATALOG_CACHE_MAX_SIZE, ttl=settings.CATALOG_CACHE_TTL_SECONDS
+)
+product_page_cache = TieredCache(
+    "products", maxsize=settings.CATALOG_CACHE_MAX_SIZE, ttl=settings.CATALOG_CACHE_TTL_SECONDS
+)
 
 
 class ProductService:
@@ -12,11 +28,18 @@ class ProductService:
     # Category methods
     async def create_category(self, category_in: CategoryCreate) -> Category:
         db_category = await category.create(self.db, obj_in=category_in)
+        await category_list_cache.clear()
         return Category.from_orm(db_category)
 
     async def get_categories(self) -> List[Category]:
+        cached = await category_list_cache.get("active")
+        if cached is not None:
+            return [Category(**c) for c in cached]
+
         db_categories = await category.get_active(self.db)
-        return [Category.from_orm(c) for c in db_categories]
+        categories = [Category.from_orm(c) for c in db_categories]
+        await category_list_cache.set("active", categories)
+        return categories
 
     async def get_category(self, category_id: int) -> Category:
         db_category = await category.get(self.db, id=category_id)
@@ -31,29 +54,48 @@ class ProductService:
             raise ValueError("Category not found")
 
         db_product = await product.create(self.db, obj_in=product_in)
+        await product_page_cache.clear()
         return Product.from_orm(db_product)
 
     async def get_products(
         self,
-        skip: int = 0,
+        cursor: Optional[str] = None,
         limit: int = 100,
         category_id: Optional[int] = None,
         search: Optional[str] = None
-    ) -> List[Product]:
-        db_products = await product.search(
+    ) -> Tuple[List[Product], Optional[str]]:
+        key = json.dumps([cursor, limit, category_id, search])
+        cached = await product_page_cache.get(key)
+        if cached is not None:
+            return [Product(**p) for p in cached["items"]], cached["next_cursor"]
+
+        db_products, next_cursor = await product.search(
             self.db,
-            skip=skip,
+            cursor=cursor,
             limit=limit,
             category_id=category_id,
-            search=search
+            query=search
         )
-        return [Product.from_orm(p) for p in db_products]
+        products = [Product.from_orm(p) for p in db_products]
+        await product_page_cache.set(key, {"items": products, "next_cursor": next_cursor})
+        return products, next_cursor
+
+    async def suggest_products(self, prefix: str, limit: int = 10) -> List[ProductSuggestion]:
+        db_products = await product.suggest(self.db, prefix=prefix, limit=limit)
+        return [ProductSuggestion.from_orm(p) for p in db_products]
 
     async def get_product(self, product_id: int) -> Product:
+        cached = await product_cache.get(product_id)
+        if cached is not None:
+            return Product(**cached)
+
         db_product = await product.get(self.db, id=product_id)
         if not db_product:
             raise ValueError("Product not found")
-        return Product.from_orm(db_product)
+
+        product_data = Product.from_orm(db_product)
+        await product_cache.set(product_id, product_data)
+        return product_data
 
     async def update_product(self, product_id: int, product_in: ProductUpdate) -> Product:
         db_product = await product.get(self.db, id=product_id)
@@ -66,6 +108,10 @@ class ProductService:
                 raise ValueError("Category not found")
 
         db_product = await product.update(self.db, db_obj=db_product, obj_in=product_in)
+        await product_cache.delete(product_id)
+        await product_page_cache.clear()
+        # Cached carts embed the product's price and availability
+        await cart_cache.clear()
         return Product.from_orm(db_product)
 
     async def delete_product(self, product_id: int) -> bool:
@@ -74,4 +120,7 @@ class ProductService:
             raise ValueError("Product not found")
 
         await product.remove(self.db, id=product_id)
+        await product_cache.delete(product_id)
+        await product_page_cache.clear()
+        await cart_cache.clear()
         return True
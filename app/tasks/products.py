@@ -0,0 +1,22 @@
+import asyncio
+import logging
+
+from app.core.celery_app import celery_app
+from app.crud.product import product
+from app.db.base import async_session
+
+
+@celery_app.task
+def rebuild_product_search_index():
+    """
+    Recomputes the full-text search vectors of all products, e.g. after
+    a category is renamed or for products created before search existed.
+    """
+    async def _rebuild():
+        async with async_session() as db:
+            await product.update_search_vector(db)
+            logging.info("Rebuilt product search index")
+
+        return True
+
+    return asyncio.run(_rebuild())
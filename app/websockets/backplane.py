@@ -0,0 +1,112 @@
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, List, Optional
+
+from app.core.config import settings
+
+
+MessageHandler = Callable[[int, str], Awaitable[None]]
+
+
+class Backplane(ABC):
+    """
+    Carries chat frames between workers. A frame published for a session on
+    any worker is handed to the handler of every worker, including the
+    publishing one, which then delivers it to its local connections.
+    """
+
+    @abstractmethod
+    async def start(self, handler: MessageHandler) -> None:
+        """Starts handing published frames to the handler"""
+
+    @abstractmethod
+    async def stop(self) -> None:
+        """Stops handing frames to the handler"""
+
+    @abstractmethod
+    async def publish(self, session_id: int, message: str) -> None:
+        """Publishes a frame for the session to every worker"""
+
+
+class InMemoryBackplane(Backplane):
+    """
+    Single-process backplane, used in development and tests. Every manager
+    started on the same instance gets each frame, like workers sharing Redis.
+    """
+
+    def __init__(self):
+        self.handlers: List[MessageHandler] = []
+
+    async def start(self, handler: MessageHandler) -> None:
+        self.handlers.append(handler)
+
+    async def stop(self) -> None:
+        self.handlers.clear()
+
+    async def publish(self, session_id: int, message: str) -> None:
+        for handler in list(self.handlers):
+            await handler(session_id, message)
+
+
+class RedisBackplane(Backplane):
+    """Backplane over Redis pub/sub with one channel per chat session"""
+
+    channel_prefix = "chat:session:"
+
+    def __init__(self, url: str):
+        self.url = url
+        self.handler: Optional[MessageHandler] = None
+        self._redis = None
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self, handler: MessageHandler) -> None:
+        import redis.asyncio as redis
+
+        self.handler = handler
+        self._redis = redis.from_url(self.url)
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+        self.handler = None
+
+    async def publish(self, session_id: int, message: str) -> None:
+        await self._redis.publish(f"{self.channel_prefix}{session_id}", message)
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.psubscribe(f"{self.channel_prefix}*")
+                async for item in pubsub.listen():
+                    if item["type"] != "pmessage":
+                        continue
+                    channel = item["channel"].decode()
+                    session_id = int(channel[len(self.channel_prefix):])
+                    try:
+                        await self.handler(session_id, item["data"].decode())
+                    except Exception as e:
+                        logging.warning(f"Chat frame delivery failed for session {session_id}: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.warning(f"Chat backplane connection lost, reconnecting: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+
+def create_backplane() -> Backplane:
+    if settings.CHAT_BACKPLANE_URL:
+        return RedisBackplane(settings.CHAT_BACKPLANE_URL)
+    return InMemoryBackplane()
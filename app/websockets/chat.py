@@ -1,41 +1,239 @@
-from typing import Dict
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, List, Optional, Set
 from datetime import datetime
-from fastapi import WebSocket, WebSocketDisconnect, Depends, HTTPException, status
+from fastapi import WebSocket, WebSocketDisconnect, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.base import get_db
+from app.core.config import settings
+from app.crud import chat_message, chat_session
+from app.crud.chat import message_cursor
+from app.db.base import async_session
 from app.services.chat import ChatService
-from app.schemas import WebSocketMessage
+from app.schemas import ChatMessage, WebSocketMessage
+from app.schemas.chat import MAX_MESSAGE_LENGTH
+from app.websockets.backplane import Backplane, create_backplane
+from app.websockets.connection import REPLACED_CLOSE_CODE, ClientConnection
+from app.websockets.presence import (
+    PING_FRAME, PresenceTracker, TypingThrottle, control_type, presence_frame, typing_frame
+)
+from app.websockets.writer import chat_writer
 
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[int, Dict[int, WebSocket]] = {}
+    def __init__(self, backplane: Backplane):
+        self.backplane = backplane
+        self.active_connections: Dict[int, Set[ClientConnection]] = {}
+        self.connections: Set[ClientConnection] = set()
+        self.presence = PresenceTracker()
+        self.typing = TypingThrottle(settings.CHAT_TYPING_INTERVAL_SECONDS)
+        self.dropped_frames = 0
+        self.reaped_connections = 0
+        self._heartbeat: Optional[asyncio.Task] = None
 
-    async def connect(self, websocket: WebSocket, session_id: int, user_id: int):
+    async def start(self):
+        await self.backplane.start(self.deliver)
+        if settings.CHAT_HEARTBEAT_INTERVAL_SECONDS > 0:
+            self._heartbeat = asyncio.create_task(self._run_heartbeat())
+
+    async def stop(self):
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            try:
+                await self._heartbeat
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat = None
+        await self.backplane.stop()
+        for connection in self.connections:
+            connection.close()
+        self.connections.clear()
+        self.active_connections.clear()
+
+    async def accept(
+        self, websocket: WebSocket, user_id: int, connection_class=ClientConnection, **kwargs
+    ) -> ClientConnection:
+        """Accepts the socket and starts the writer of its outbound queue"""
         await websocket.accept()
-        if session_id not in self.active_connections:
-            self.active_connections[session_id] = {}
-        self.active_connections[session_id][user_id] = websocket
+        connection = connection_class(
+            websocket,
+            queue_size=settings.CHAT_SEND_QUEUE_SIZE,
+            policy=settings.CHAT_SLOW_CLIENT_POLICY,
+            user_id=user_id,
+            **kwargs
+        )
+        connection.start()
+        self.connections.add(connection)
+        return connection
+
+    def register(self, connection: ClientConnection, session_id: int):
+        self.active_connections.setdefault(session_id, set()).add(connection)
+        connection.sessions.add(session_id)
+
+    def unregister(self, connection: ClientConnection, session_id: int):
+        """Removes the connection, and only it, from the session"""
+        connection.sessions.discard(session_id)
+        connections = self.active_connections.get(session_id)
+        if connections is None:
+            return
+        connections.discard(connection)
+        if not connections:
+            del self.active_connections[session_id]
 
-    def disconnect(self, session_id: int, user_id: int):
-        if session_id in self.active_connections and user_id in self.active_connections[session_id]:
-            del self.active_connections[session_id][user_id]
-            if not self.active_connections[session_id]:
-                del self.active_connections[session_id]
+    def user_connections(self, session_id: int, user_id: int) -> List[ClientConnection]:
+        return [
+            connection for connection in self.active_connections.get(session_id, ())
+            if connection.user_id == user_id
+        ]
+
+    async def join(self, connection: ClientConnection, session_id: int):
+        """Registers the connection in the session and announces its user as online"""
+        if session_id in connection.sessions:
+            return
+        self.register(connection, session_id)
+        await self.broadcast(presence_frame(session_id, connection.user_id, online=True), session_id)
+
+    async def leave(self, connection: ClientConnection, session_id: int):
+        """Unregisters the connection from the session and announces its user as gone"""
+        if session_id not in connection.sessions:
+            return
+        self.unregister(connection, session_id)
+        await self.broadcast(presence_frame(session_id, connection.user_id, online=False), session_id)
+
+    async def connect(
+        self, websocket: WebSocket, session_id: int, user_id: int, hold: bool = False
+    ) -> ClientConnection:
+        """
+        Accepts a per-session socket, replacing the user's previous one in the
+        session; the user's multiplexed staff sockets are left alone
+        """
+        connection = await self.accept(websocket, user_id)
+        if hold:
+            connection.hold()
+        previous = [c for c in self.user_connections(session_id, user_id) if not c.multiplexed]
+        await self.join(connection, session_id)
+        for replaced in previous:
+            await self.disconnect(replaced, code=REPLACED_CLOSE_CODE, reason="Replaced by a new connection")
+        return connection
+
+    async def disconnect(
+        self, connection: ClientConnection, code: Optional[int] = None, reason: Optional[str] = None
+    ):
+        """Removes the connection from all of its sessions and closes it"""
+        for session_id in list(connection.sessions):
+            await self.leave(connection, session_id)
+        connection.close(code=code, reason=reason)
+        self.connections.discard(connection)
 
     async def send_personal_message(self, message: str, session_id: int, user_id: int):
-        if session_id in self.active_connections and user_id in self.active_connections[session_id]:
-            websocket = self.active_connections[session_id][user_id]
-            await websocket.send_text(message)
+        for connection in self.user_connections(session_id, user_id):
+            if not connection.send(message):
+                self.dropped_frames += 1
 
     async def broadcast(self, message: str, session_id: int):
-        if session_id in self.active_connections:
-            for user_id, websocket in self.active_connections[session_id].items():
-                await websocket.send_text(message)
+        """Sends the message to every connection of the session, on all workers"""
+        await self.backplane.publish(session_id, message)
+
+    async def deliver(self, session_id: int, message: str):
+        """
+        Queues a message from the backplane on this worker's connections of the
+        session. Never waits on a client: each connection has its own writer.
+        """
+        self.presence.observe(session_id, message)
+        if session_id not in self.active_connections:
+            return
+
+        for connection in list(self.active_connections[session_id]):
+            if connection.closed:
+                continue
+            if not connection.deliver(session_id, message):
+                self.dropped_frames += 1
+
+    async def reap_idle(self):
+        """
+        Disconnects connections that are closed, or that within
+        CHAT_IDLE_TIMEOUT_SECONDS neither sent anything (a pong included) nor
+        had a chat frame written to them, and pings the others. Pings don't
+        count as traffic, so a quiet client that never answers them is reaped.
+        """
+        deadline = time.monotonic() - settings.CHAT_IDLE_TIMEOUT_SECONDS
+        for connection in list(self.connections):
+            if connection.closed or connection.last_seen < deadline:
+                await self.disconnect(connection, code=status.WS_1001_GOING_AWAY)
+                self.reaped_connections += 1
+            else:
+                connection.send(PING_FRAME)
+
+    async def _run_heartbeat(self):
+        while True:
+            await asyncio.sleep(settings.CHAT_HEARTBEAT_INTERVAL_SECONDS)
+            try:
+                await self.reap_idle()
+            except Exception as e:
+                logging.warning(f"Chat heartbeat failed: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        connections = list(self.connections)
+        return {
+            "sessions": len(self.active_connections),
+            "connections": len(connections),
+            "queued_frames": sum(connection.queue.qsize() for connection in connections),
+            "max_queue_depth": max((connection.queue.qsize() for connection in connections), default=0),
+            "dropped_frames": self.dropped_frames,
+            "reaped_connections": self.reaped_connections
+        }
+
+
+manager = ConnectionManager(create_backplane())
+background_tasks: Set[asyncio.Task] = set()
+
+
+def status_frame(session_id: int, text: str) -> str:
+    return WebSocketMessage(
+        type="status",
+        session_id=session_id,
+        content=text,
+        sender="system",
+        timestamp=datetime.utcnow()
+    ).json()
+
 
+def message_frame(chat_message: ChatMessage, sender: str) -> str:
+    return WebSocketMessage(
+        session_id=chat_message.session_id,
+        content=chat_message.content,
+        sender=sender,
+        sender_id=chat_message.sender_id,
+        message_id=chat_message.id,
+        cursor=message_cursor(chat_message),
+        timestamp=chat_message.created_at
+    ).json()
 
-manager = ConnectionManager()
+
+def read_frame(session_id: int, reader_id: int, message_ids: List[int]) -> str:
+    return json.dumps({"type": "read", "session_id": session_id, "reader_id": reader_id, "message_ids": message_ids})
+
+
+def run_in_background(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+
+async def broadcast_when_stored(future: asyncio.Future, connection: ClientConnection, sender: str):
+    """Broadcasts a buffered message once it is stored; the frame is also the sender's ack"""
+    try:
+        chat_message = await future
+    except ValueError as e:
+        connection.send(json.dumps({"type": "error", "detail": str(e)}))
+        return
+    except Exception:
+        connection.send(json.dumps({"type": "error", "detail": "Message could not be stored"}))
+        return
+    await manager.broadcast(message_frame(chat_message, sender), chat_message.session_id)
 
 
 async def get_token_data(token: str):
@@ -59,63 +257,92 @@ async def get_user_by_token(token: str, db: AsyncSession):
     return user
 
 
-async def websocket_endpoint(
-    websocket: WebSocket,
-    session_id: int,
-    token: str,
-    db: AsyncSession = Depends(get_db)
-):
+async def resolve_active_session_id(user_id: int) -> Optional[int]:
+    """Cached lookup of the user's active session; only touches the database on a miss"""
+    async with async_session() as db:
+        return await ChatService(db).resolve_session_id(user_id, create=False)
+
+
+async def replay_missed(connection: ClientConnection, session_id: int, resume: str):
+    """
+    Sends the messages stored after the resume cursor ahead of any live frame
+    that arrived meanwhile; the connection must be holding its frames. The
+    replay waits for room in the send queue rather than dropping frames,
+    since it can be longer than the queue.
+    """
     try:
-        user = await get_user_by_token(token, db)
-    except HTTPException:
-        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
-        return
+        async with async_session() as db:
+            missed = await chat_message.get_missed(
+                db, session_id=session_id, after=resume, limit=settings.CHAT_RESUME_MAX_MESSAGES
+            )
+    except ValueError as e:
+        missed = None
+        error = str(e)
 
-    from app.crud import chat_session
-    session = await chat_session.get(db, id=session_id)
-    if not session:
-        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
-        return
+    replayed_ids = set()
+    if missed is None:
+        await connection.put(json.dumps({"type": "error", "detail": error}))
+    else:
+        for db_message, sender in missed:
+            replayed_ids.add(db_message.id)
+            await connection.put(message_frame(db_message, sender))
+        await connection.put(json.dumps({
+            "type": "resumed",
+            "count": len(missed),
+            "complete": len(missed) < settings.CHAT_RESUME_MAX_MESSAGES
+        }))
+    await connection.flush_held(lambda frame: json.loads(frame).get("message_id") not in replayed_ids)
+
+
+async def websocket_endpoint(websocket: WebSocket, session_id: int, token: str, resume: Optional[str] = None):
+    """
+    Chat socket for one session. A database session is only opened for the
+    handshake, so idle sockets don't hold pooled connections; messages are
+    stored in batches by the chat writer. A `resume` cursor replays the
+    messages the client missed while disconnected. Besides plain text
+    messages, clients send `{"type": "pong"}` in reply to pings and
+    `{"type": "typing"}` while typing.
+    """
+    async with async_session() as db:
+        try:
+            user = await get_user_by_token(token, db)
+        except HTTPException:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
 
-    is_staff = user.role in ["admin", "staff"]
-    if session.user_id != user.id and not is_staff:
+        is_staff = user.role in ["admin", "staff"]
+        if is_staff:
+            allowed = await chat_session.get(db, id=session_id) is not None
+        else:
+            allowed = await ChatService(db).resolve_session_id(user.id, create=False) == session_id
+
+    if not allowed:
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return
 
-    await manager.connect(websocket, session_id, user.id)
+    connection = await manager.connect(websocket, session_id, user.id, hold=bool(resume))
+    if resume:
+        await replay_missed(connection, session_id, resume)
 
     try:
-        chat_service = ChatService(db)
-        status_message = WebSocketMessage(
-            message=f"User {user.email} connected to the chat",
-            session_id=session_id,
-            timestamp=datetime.utcnow()
-        )
-        await manager.broadcast(status_message.json(), session_id)
+        await manager.broadcast(status_frame(session_id, f"User {user.email} connected to the chat"), session_id)
         while True:
             message_text = await websocket.receive_text()
-            if is_staff:
-                chat_message = await chat_service.add_staff_message(
-                    session_id=session_id,
-                    staff_id=user.id,
-                    message_text=message_text
-                )
-            else:
-                chat_message = await chat_service.add_message(
-                    user_id=user.id,
-                    message_text=message_text
-                )
-            out_message = WebSocketMessage(
-                message=message_text,
-                session_id=session_id,
-                timestamp=chat_message.created_at
-            )
-            await manager.broadcast(out_message.json(), session_id)
-    except WebSocketDisconnect:
-        manager.disconnect(session_id, user.id)
-        status_message = WebSocketMessage(
-            message=f"User {user.email} disconnected from the chat",
-            session_id=session_id,
-            timestamp=datetime.utcnow()
-        )
-        await manager.broadcast(status_message.json(), session_id)
+            connection.touch()
+            control = control_type(message_text)
+            if control == "typing" and manager.typing.allow(session_id, user.id):
+                await manager.broadcast(typing_frame(session_id, user.id), session_id)
+            if control is not None:
+                continue
+            if not message_text or len(message_text) > MAX_MESSAGE_LENGTH:
+                connection.send(json.dumps({"type": "error", "detail": "Invalid message length"}))
+                continue
+            if not is_staff and await resolve_active_session_id(user.id) != session_id:
+                connection.send(json.dumps({"type": "error", "detail": "Chat session is closed"}))
+                continue
+            future = await chat_writer.submit(session_id, user.id, message_text)
+            run_in_background(broadcast_when_stored(future, connection, user.email))
+    except (WebSocketDisconnect, RuntimeError):
+        # RuntimeError: the socket was already closed by the idle reaper
+        await manager.disconnect(connection)
+        await manager.broadcast(status_frame(session_id, f"User {user.email} disconnected from the chat"), session_id)
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import time
+from typing import Callable, List, Optional, Set
+
+from fastapi import WebSocket, status
+
+from app.websockets.presence import PING_FRAME
+
+
+# Close code sent to a socket replaced by a newer connection of the same user
+REPLACED_CLOSE_CODE = 4000
+
+
+class SlowClientPolicy:
+    DROP_OLDEST = "drop_oldest"
+    DROP_NEWEST = "drop_newest"
+    DISCONNECT = "disconnect"
+
+
+class ClientConnection:
+    """
+    WebSocket with a bounded outbound queue drained by a dedicated writer
+    task, so that sending to a slow client never blocks the sender. When the
+    queue is full the policy decides whether the oldest or the newest frame
+    is dropped, or the client is disconnected.
+    """
+
+    multiplexed = False
+
+    def __init__(self, websocket: WebSocket, queue_size: int, policy: str, user_id: Optional[int] = None):
+        self.websocket = websocket
+        self.policy = policy
+        self.user_id = user_id
+        self.last_seen = time.monotonic()
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.closed = False
+        self.sessions: Set[int] = set()
+        self._held: Optional[List[str]] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._closing: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._writer = asyncio.create_task(self._write())
+
+    def touch(self) -> None:
+        """Records that the client is alive, which keeps it from being reaped"""
+        self.last_seen = time.monotonic()
+
+    def send(self, message: str) -> bool:
+        """Queues the message; returns False if a frame had to be dropped"""
+        if self.closed:
+            return False
+        if self._held is not None:
+            self._held.append(message)
+            return True
+
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            pass
+
+        self.dropped += 1
+        if self.policy == SlowClientPolicy.DISCONNECT:
+            self.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        elif self.policy == SlowClientPolicy.DROP_OLDEST:
+            self.queue.get_nowait()
+            self.queue.task_done()
+            self.queue.put_nowait(message)
+        return False
+
+    def hold(self) -> None:
+        """Sets aside frames sent from now on until flush_held()"""
+        self._held = []
+
+    async def put(self, message: str) -> bool:
+        """
+        Queues the message, waiting for room instead of applying the slow
+        client policy; frames are not held back. Returns False if closed.
+        """
+        if self.closed:
+            return False
+        await self.queue.put(message)
+        return True
+
+    async def flush_held(self, keep: Callable[[str], bool] = lambda message: True) -> None:
+        """
+        Queues the held frames that `keep` accepts, waiting for room, then
+        stops holding. Frames held meanwhile are queued after them, in order.
+        """
+        while self._held:
+            held, self._held = self._held, []
+            for message in held:
+                if keep(message):
+                    await self.put(message)
+        self._held = None
+
+    def deliver(self, session_id: int, message: str) -> bool:
+        """Queues a frame broadcast to one of the connection's sessions"""
+        return self.send(message)
+
+    async def join(self) -> None:
+        """Waits until every queued frame has been written"""
+        await self.queue.join()
+
+    def close(self, code: Optional[int] = None, reason: Optional[str] = None) -> None:
+        """Stops the writer; closes the socket too if a close code is given"""
+        if self.closed:
+            return
+        self.closed = True
+        if self._writer is not None:
+            self._writer.cancel()
+        self._discard()
+        if code is not None:
+            self._closing = asyncio.create_task(self._close_socket(code, reason))
+
+    async def _close_socket(self, code: int, reason: Optional[str]) -> None:
+        try:
+            await self.websocket.close(code=code, reason=reason)
+        except Exception as e:
+            logging.info(f"Chat connection close failed: {e}")
+
+    async def _write(self) -> None:
+        while True:
+            message = await self.queue.get()
+            try:
+                await self.websocket.send_text(message)
+                # Delivered traffic keeps read-only clients alive; our own pings
+                # don't, since only a pong shows that the client reads them
+                if message != PING_FRAME:
+                    self.touch()
+            except Exception as e:
+                logging.info(f"Chat connection send failed, closing: {e}")
+                self.closed = True
+                self._discard()
+                return
+            finally:
+                self.queue.task_done()
+
+    def _discard(self) -> None:
+        while not self.queue.empty():
+            self.queue.get_nowait()
+            self.queue.task_done()
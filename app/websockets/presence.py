@@ -0,0 +1,79 @@
+import json
+from typing import Dict, List, Optional
+
+from app.core.cache import TTLCache
+
+
+PRESENCE_PREFIX = '{"type":"presence"'
+PING_FRAME = '{"type":"ping"}'
+CONTROL_TYPES = ("pong", "typing")
+
+
+def presence_frame(session_id: int, user_id: int, online: bool) -> str:
+    return json.dumps(
+        {"type": "presence", "session_id": session_id, "user_id": user_id, "online": online},
+        separators=(",", ":")
+    )
+
+
+def typing_frame(session_id: int, user_id: int) -> str:
+    return json.dumps({"type": "typing", "session_id": session_id, "user_id": user_id})
+
+
+def control_type(text: str) -> Optional[str]:
+    """Type of a JSON control frame sent by a client, None for a plain chat message"""
+    if not text.startswith("{"):
+        return None
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return None
+    if isinstance(data, dict) and data.get("type") in CONTROL_TYPES:
+        return data["type"]
+    return None
+
+
+class PresenceTracker:
+    """
+    Who is connected to each chat session, best effort. It is fed the
+    presence frames coming through the backplane, so it sees joins and
+    leaves on every worker without touching the database. It only knows of
+    joins since this worker started, though, and a worker that dies never
+    announces its leaves, so the view can miss users or keep stale ones
+    until the affected workers restart.
+    """
+
+    def __init__(self):
+        self.connections: Dict[int, Dict[int, int]] = {}
+
+    def observe(self, session_id: int, message: str) -> None:
+        if not message.startswith(PRESENCE_PREFIX):
+            return
+
+        frame = json.loads(message)
+        users = self.connections.setdefault(session_id, {})
+        user_id = frame["user_id"]
+        count = users.get(user_id, 0) + (1 if frame["online"] else -1)
+        if count > 0:
+            users[user_id] = count
+        else:
+            users.pop(user_id, None)
+        if not users:
+            del self.connections[session_id]
+
+    def online(self, session_id: int) -> List[int]:
+        return sorted(self.connections.get(session_id, {}))
+
+
+class TypingThrottle:
+    """Lets a user's typing indicator through at most once per interval and session"""
+
+    def __init__(self, interval: float, maxsize: int = 10000):
+        self._recent = TTLCache(maxsize=maxsize, ttl=interval)
+
+    def allow(self, session_id: int, user_id: int) -> bool:
+        key = (session_id, user_id)
+        if self._recent.get(key) is not None:
+            return False
+        self._recent.set(key, True)
+        return True
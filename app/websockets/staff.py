@@ -0,0 +1,130 @@
+import json
+from typing import Dict, List, Optional
+
+from fastapi import WebSocket, WebSocketDisconnect, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.crud import chat_session, chat_message
+from app.db.base import async_session
+from app.schemas import StaffAction
+from app.services.chat import ChatService
+from app.websockets.chat import manager, get_user_by_token, broadcast_when_stored, read_frame, run_in_background
+from app.websockets.connection import ClientConnection
+from app.websockets.presence import typing_frame
+from app.websockets.writer import chat_writer
+
+
+class StaffConnection(ClientConnection):
+    """
+    Staff socket subscribed to many chat sessions at once. Every frame it
+    receives is already tagged with its session_id; messages from other users
+    also bump the session's unread counter, which is pushed right after them.
+    """
+
+    multiplexed = True
+
+    def __init__(self, websocket: WebSocket, queue_size: int, policy: str, user_id: int):
+        super().__init__(websocket, queue_size, policy, user_id=user_id)
+        self.unread: Dict[int, int] = {}
+
+    def deliver(self, session_id: int, message: str) -> bool:
+        delivered = self.send(message)
+        frame = json.loads(message)
+        if frame.get("type") == "message" and frame.get("sender_id") != self.user_id:
+            self.unread[session_id] = self.unread.get(session_id, 0) + 1
+            delivered = self.push_unread(session_id) and delivered
+        return delivered
+
+    def push_unread(self, session_id: int) -> bool:
+        return self.send_json({"type": "unread", "session_id": session_id, "count": self.unread.get(session_id, 0)})
+
+    def send_json(self, data: dict) -> bool:
+        return self.send(json.dumps(data))
+
+
+async def subscribe(
+    db: AsyncSession, connection: StaffConnection, session_ids: Optional[List[int]] = None
+) -> None:
+    """Subscribes to the given active sessions, or to all of them when none are given"""
+    sessions = await chat_session.get_active(db, ids=session_ids)
+    ids = [session.id for session in sessions]
+    counts = await chat_message.count_unread_by_session(
+        db, session_ids=ids, exclude_sender_id=connection.user_id
+    )
+    for session in sessions:
+        connection.unread[session.id] = counts[session.id]
+        await manager.join(connection, session.id)
+
+    connection.send_json({
+        "type": "subscribed",
+        "sessions": [
+            {"session_id": session.id, "user_id": session.user_id, "unread_count": counts[session.id]}
+            for session in sessions
+        ]
+    })
+
+
+async def unsubscribe(connection: StaffConnection, session_ids: Optional[List[int]] = None) -> None:
+    """Unsubscribes from the given sessions, or from all of them when none are given"""
+    if session_ids is None:
+        session_ids = list(connection.sessions)
+    for session_id in session_ids:
+        await manager.leave(connection, session_id)
+        connection.unread.pop(session_id, None)
+    connection.send_json({"type": "unsubscribed", "session_ids": session_ids})
+
+
+async def handle_action(db: AsyncSession, connection: StaffConnection, sender: str, data: dict) -> None:
+    """Validates and runs an action; invalid payloads raise ValueError"""
+    staff_action = StaffAction.parse_obj(data)
+    action = staff_action.action
+    session_id = staff_action.session_id
+
+    if action == "subscribe":
+        await subscribe(db, connection, staff_action.session_ids)
+    elif action == "unsubscribe":
+        await unsubscribe(connection, staff_action.session_ids)
+    elif session_id not in connection.sessions:
+        raise ValueError("Not subscribed to the chat session")
+    elif action == "message":
+        future = await chat_writer.submit(session_id, connection.user_id, staff_action.content)
+        run_in_background(broadcast_when_stored(future, connection, sender))
+    elif action == "read":
+        chat_service = ChatService(db)
+        message_ids = await chat_service.mark_messages_as_read(session_id=session_id, user_id=connection.user_id)
+        connection.unread[session_id] = 0
+        connection.push_unread(session_id)
+        if message_ids:
+            await manager.broadcast(read_frame(session_id, connection.user_id, message_ids), session_id)
+    elif action == "typing":
+        if manager.typing.allow(session_id, connection.user_id):
+            await manager.broadcast(typing_frame(session_id, connection.user_id), session_id)
+
+
+async def staff_websocket_endpoint(websocket: WebSocket, token: str):
+    """Staff socket for many sessions; like the per-session one, it holds no database session while idle"""
+    async with async_session() as db:
+        try:
+            user = await get_user_by_token(token, db)
+        except HTTPException:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+
+    if user.role not in ["admin", "staff"]:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    connection = await manager.accept(websocket, user.id, StaffConnection)
+    try:
+        while True:
+            try:
+                data = json.loads(await websocket.receive_text())
+                connection.touch()
+                if isinstance(data, dict) and data.get("type") == "pong":
+                    continue
+                async with async_session() as db:
+                    await handle_action(db, connection, user.email, data)
+            except ValueError as e:
+                connection.send_json({"type": "error", "detail": str(e)})
+    except (WebSocketDisconnect, RuntimeError):
+        await manager.disconnect(connection)
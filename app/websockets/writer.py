@@ -0,0 +1,123 @@
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+
+from app.core.config import settings
+from app.crud import chat_message, chat_session
+from app.crud.base import save_changes
+from app.db.base import async_session
+from app.schemas import ChatMessage
+
+
+class ChatMessageWriter:
+    """
+    Write-behind persistence for chat messages. Submitted messages are
+    buffered and flushed with one multi-row INSERT every `flush_interval`
+    seconds or as soon as `batch_size` are pending; each submitter gets a
+    future resolved with the stored message, server id and timestamp
+    included. At most `max_buffer` messages wait at once, further submitters
+    wait for a flush. Messages for sessions closed since they were accepted
+    are rejected with a ValueError.
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float, max_buffer: int):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer: List[Tuple[dict, asyncio.Future]] = []
+        self._slots = asyncio.Semaphore(max_buffer)
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._flusher: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._stopping = False
+        self._flusher = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Stops the flusher once it has written whatever is buffered. It is not
+        cancelled, so a flush in progress is never cut short.
+        """
+        self._stopping = True
+        self._wakeup.set()
+        if self._flusher is not None:
+            await self._flusher
+            self._flusher = None
+        while self.buffer:
+            await self.flush()
+
+    async def submit(self, session_id: int, sender_id: int, content: str) -> asyncio.Future:
+        """Buffers a message; the returned future resolves once it is stored"""
+        await self._slots.acquire()
+        future = asyncio.get_running_loop().create_future()
+        self.buffer.append((
+            {"session_id": session_id, "sender_id": sender_id, "content": content, "is_read": False},
+            future
+        ))
+        if len(self.buffer) >= self.batch_size:
+            self._wakeup.set()
+        return future
+
+    async def flush(self) -> None:
+        batch, self.buffer = self.buffer[:self.batch_size], self.buffer[self.batch_size:]
+        if not batch:
+            return
+
+        try:
+            async with async_session() as db:
+                session_ids = list({values["session_id"] for values, _ in batch})
+                active = {session.id for session in await chat_session.get_active(db, ids=session_ids)}
+                for values, future in batch:
+                    if values["session_id"] not in active and not future.done():
+                        future.set_exception(ValueError("Chat session is closed"))
+                pending = [(values, future) for values, future in batch if values["session_id"] in active]
+                try:
+                    await self._store(db, pending)
+                except Exception as e:
+                    # One bad row fails the whole INSERT: retry row by row so it
+                    # only fails its own message
+                    await db.rollback()
+                    logging.warning(f"Failed to store {len(pending)} chat messages at once, retrying one by one: {e}")
+                    for item in pending:
+                        try:
+                            await self._store(db, [item])
+                        except Exception as e:
+                            await db.rollback()
+                            logging.error(f"Failed to store a chat message: {e}")
+                            if not item[1].done():
+                                item[1].set_exception(e)
+        except Exception as e:
+            logging.error(f"Failed to store {len(batch)} chat messages: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            for _ in batch:
+                self._slots.release()
+
+    async def _store(self, db, items: List[Tuple[dict, asyncio.Future]]) -> None:
+        """Inserts the messages with one statement, then resolves their futures"""
+        if not items:
+            return
+        db_messages = await chat_message.create_many(db, objs_in=[values for values, _ in items])
+        await save_changes(db)
+        for (_, future), db_message in zip(items, db_messages):
+            if not future.done():
+                future.set_result(ChatMessage.from_orm(db_message))
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self.buffer:
+                await self.flush()
+
+
+chat_writer = ChatMessageWriter(
+    batch_size=settings.CHAT_WRITER_BATCH_SIZE,
+    flush_interval=settings.CHAT_WRITER_FLUSH_INTERVAL_MS / 1000,
+    max_buffer=settings.CHAT_WRITER_MAX_BUFFER
+)
@@ -2,6 +2,7 @@
 import pytest
 import asyncio
 from typing import AsyncGenerator, Generator
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from fastapi.testclient import TestClient
@@ -44,6 +45,7 @@ def event_loop() -> Generator:
 async def test_db() -> AsyncGenerator[None, None]:
     # Create the test database and tables
     async with test_engine.begin() as conn:
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
         await conn.run_sync(Base.metadata.drop_all)
         await conn.run_sync(Base.metadata.create_all)
 
@@ -0,0 +1,54 @@
+import time
+
+from app.core.cache import TTLCache
+
+
+class TestTTLCache:
+    """Test cases for the in-process TTL cache"""
+
+    def test_get_and_set(self):
+        """Test that stored values are returned and counted as hits"""
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache.set("a", 1)
+
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_expiry(self):
+        """Test that entries expire after their TTL"""
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache.set("a", 1, ttl=0.01)
+        time.sleep(0.02)
+
+        assert cache.get("a") is None
+        assert len(cache) == 0
+
+    def test_per_entry_ttl_is_capped(self):
+        """Test that a per-entry TTL never exceeds the cache TTL"""
+        cache = TTLCache(maxsize=10, ttl=0.01)
+        cache.set("a", 1, ttl=60)
+        time.sleep(0.02)
+
+        assert cache.get("a") is None
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted first"""
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.get("c") == 3
+
+    def test_delete(self):
+        """Test explicit invalidation"""
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache.set("a", 1)
+        cache.delete("a")
+
+        assert cache.get("a") is None
@@ -0,0 +1,300 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from pydantic import ValidationError
+from sqlalchemy.dialects import postgresql
+
+from app.crud import cart_item, order, product
+from app.core.cache import TieredCache
+from app.core.config import Settings
+from app.schemas import CartItemCreate, CartItemUpdate, CartOperation, ProductUpdate
+from app.services import cart as cart_module, order as order_module, product as product_module
+from app.services.cart import CartService, StoredCartService
+from app.services.cart_store import InMemoryCartStore
+from app.services.order import OrderService
+from app.services.product import ProductService
+
+
+class TestCartOperations:
+    """Test cases for folding batched cart operations"""
+
+    def test_adds_are_summed(self):
+        """Test that repeated adds of a product become one increment"""
+        adds, sets, removes = CartService._fold_operations([
+            CartOperation(op="add", product_id=1, quantity=2),
+            CartOperation(op="add", product_id=1, quantity=3),
+            CartOperation(op="add", product_id=2, quantity=1)
+        ])
+
+        assert adds == {1: 5, 2: 1}
+        assert sets == {}
+        assert removes == set()
+
+    def test_last_set_or_remove_wins(self):
+        """Test that sets and removals override the earlier operations on a product"""
+        adds, sets, removes = CartService._fold_operations([
+            CartOperation(op="add", product_id=1, quantity=2),
+            CartOperation(op="set", product_id=1, quantity=4),
+            CartOperation(op="add", product_id=1, quantity=1),
+            CartOperation(op="add", product_id=2, quantity=2),
+            CartOperation(op="remove", product_id=2),
+            CartOperation(op="remove", product_id=3),
+            CartOperation(op="add", product_id=3, quantity=6)
+        ])
+
+        assert adds == {}
+        assert sets == {1: 5, 3: 6}
+        assert removes == {2}
+
+
+class TestInMemoryCartStore:
+    """Test cases for the in-memory cart store"""
+
+    @pytest.mark.asyncio
+    async def test_add_set_remove(self):
+        """Test that adds accumulate and sets and removals replace them"""
+        store = InMemoryCartStore()
+
+        assert await store.add(1, product_id=10, quantity=2) == 2
+        assert await store.add(1, product_id=10, quantity=3) == 5
+        await store.set(1, product_id=11, quantity=4)
+        assert await store.get(1) == {10: 5, 11: 4}
+
+        assert await store.remove(1, product_id=10)
+        assert not await store.remove(1, product_id=10)
+        assert await store.get(1) == {11: 4}
+        assert await store.get(2) == {}
+
+    @pytest.mark.asyncio
+    async def test_apply_and_clear(self):
+        """Test applying folded batch operations and clearing the cart"""
+        store = InMemoryCartStore()
+        await store.set(1, product_id=10, quantity=1)
+        await store.set(1, product_id=11, quantity=1)
+
+        await store.apply(1, adds={10: 2, 12: 1}, sets={13: 5}, removes={11})
+        assert await store.get(1) == {10: 3, 12: 1, 13: 5}
+
+        await store.clear(1)
+        assert await store.get(1) == {}
+
+
+class StatementRecorder:
+    """Async session stand-in that records executed statements and returns no rows"""
+
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+        return self
+
+    def one_or_none(self):
+        return None
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return []
+
+    def sql(self, index: int = -1) -> str:
+        return str(self.statements[index].compile(dialect=postgresql.dialect()))
+
+
+class TestCartItemStatements:
+    """Test cases for the cart item upsert statements, compiled for PostgreSQL"""
+
+    @pytest.mark.asyncio
+    async def test_add_or_increment(self):
+        """Test that the cart and item upserts run as CTEs of one statement"""
+        db = StatementRecorder()
+        assert await cart_item.add_or_increment(db, user_id=1, product_id=2, quantity=3) is None
+
+        sql = db.sql()
+        assert len(db.statements) == 1
+        assert "WITH cart_row AS" in sql and "item_row AS" in sql
+        assert "INSERT INTO carts" in sql and "ON CONFLICT (user_id) DO UPDATE" in sql
+        assert "products.is_available = true" in sql
+        assert "ON CONFLICT (cart_id, product_id) DO UPDATE SET quantity = (cart_items.quantity + excluded.quantity)" in sql
+        assert "JOIN products ON products.id = item_row.product_id" in sql
+
+
+    @pytest.mark.asyncio
+    async def test_upsert_many(self):
+        """Test that batched quantities are written with one VALUES ... ON CONFLICT insert"""
+        db = StatementRecorder()
+        await cart_item.upsert_many(db, cart_id=1, quantities={2: 3, 4: 5}, increment=True)
+        await cart_item.upsert_many(db, cart_id=1, quantities={2: 3}, increment=False)
+        assert await cart_item.upsert_many(db, cart_id=1, quantities={}, increment=True) == []
+
+        increment, replace = db.sql(0), db.sql(1)
+        assert len(db.statements) == 2
+        assert "JOIN (VALUES" in increment and "AS rows (product_id, quantity)" in increment
+        assert "products.is_available = true" in increment
+        assert "ON CONFLICT (cart_id, product_id) DO UPDATE SET quantity = (cart_items.quantity + excluded.quantity)" in increment
+        assert "ON CONFLICT (cart_id, product_id) DO UPDATE SET quantity = excluded.quantity" in replace
+        assert "RETURNING cart_items.product_id" in replace
+
+    @pytest.mark.asyncio
+    async def test_remove_products(self):
+        """Test that removals are one DELETE scoped to the cart, skipped when empty"""
+        db = StatementRecorder()
+        await cart_item.remove_products(db, cart_id=1, product_ids=[])
+        await cart_item.remove_products(db, cart_id=1, product_ids=[2, 4])
+
+        sql = db.sql()
+        assert len(db.statements) == 1
+        assert sql.startswith("DELETE FROM cart_items WHERE cart_items.cart_id = ")
+        assert "cart_items.product_id IN" in sql
+
+
+def make_product(product_id: int, price: float = 2.5, is_available: bool = True) -> SimpleNamespace:
+    now = datetime.utcnow()
+    return SimpleNamespace(
+        id=product_id, name=f"Coffee {product_id}", description="", price=price, stock=10,
+        is_active=True, is_available=is_available, category_id=1, created_at=now, updated_at=now
+    )
+
+
+@pytest.fixture
+def catalog(monkeypatch):
+    """Products 1 and 2 are available, 3 is not"""
+    products = {1: make_product(1), 2: make_product(2, price=4.0), 3: make_product(3, is_available=False)}
+
+    async def get(db, id):
+        return products.get(id)
+
+    async def get_by_ids(db, *, ids):
+        return [products[i] for i in ids if i in products]
+
+    monkeypatch.setattr(product, "get", get)
+    monkeypatch.setattr(product, "get_by_ids", get_by_ids)
+    return products
+
+
+class TransactionSession:
+    """Async session stand-in for a unit of work that only counts commits"""
+
+    def __init__(self):
+        self.info = {}
+        self.commits = 0
+
+    async def commit(self):
+        self.commits += 1
+
+    async def rollback(self):
+        pass
+
+
+class TestStoredCartService:
+    """Test cases for carts kept in a cart store until checkout"""
+
+    @pytest.mark.asyncio
+    async def test_add_update_remove(self, catalog):
+        """Test that cart writes go to the store and items are keyed by product id"""
+        store = InMemoryCartStore()
+        service = StoredCartService(None, store)
+
+        await service.add_item(101, CartItemCreate(product_id=1, quantity=2))
+        item = await service.add_item(101, CartItemCreate(product_id=1, quantity=1))
+        await service.add_item(101, CartItemCreate(product_id=2, quantity=1))
+        assert (item.id, item.quantity, item.price) == (1, 3, 2.5)
+
+        updated = await service.update_item(101, 2, CartItemUpdate(quantity=2))
+        assert updated.quantity == 2
+        user_cart = await service.get_user_cart(101)
+        assert {i.id: i.quantity for i in user_cart.items} == {1: 3, 2: 2}
+        assert user_cart.total_amount == 15.5
+
+        assert await service.remove_item(101, 1)
+        assert await store.get(101) == {2: 2}
+        assert [i.id for i in (await service.get_user_cart(101)).items] == [2]
+        with pytest.raises(ValueError, match="Cart item not found"):
+            await service.remove_item(101, 1)
+        with pytest.raises(ValueError, match="Cart item not found"):
+            await service.update_item(101, 1, CartItemUpdate(quantity=1))
+
+    @pytest.mark.asyncio
+    async def test_unavailable_products_are_rejected(self, catalog):
+        """Test that missing or unavailable products never reach the store"""
+        store = InMemoryCartStore()
+        service = StoredCartService(None, store)
+
+        with pytest.raises(ValueError, match="Product unavailable"):
+            await service.add_item(102, CartItemCreate(product_id=3, quantity=1))
+        with pytest.raises(ValueError, match="Product not found"):
+            await service.add_item(102, CartItemCreate(product_id=99, quantity=1))
+        with pytest.raises(ValueError, match="3"):
+            await service.apply_operations(102, [
+                CartOperation(op="add", product_id=1, quantity=1),
+                CartOperation(op="add", product_id=3, quantity=1)
+            ])
+        assert await store.get(102) == {}
+
+    @pytest.mark.asyncio
+    async def test_checkout_clears_the_store(self, catalog, monkeypatch):
+        """Test that checkout orders the stored quantities and then clears the cart"""
+        store = InMemoryCartStore()
+        await store.set(103, product_id=1, quantity=2)
+        await store.set(103, product_id=2, quantity=1)
+        created = {}
+
+        async def create_with_items(db, *, obj_in, items):
+            created.update(order=obj_in, items=items)
+            return SimpleNamespace(id=50)
+
+        async def get_order(self, user_id, order_id):
+            return order_id
+
+        monkeypatch.setattr(order_module, "cart_store", store)
+        monkeypatch.setattr(order, "create_with_items", create_with_items)
+        monkeypatch.setattr(OrderService, "get_order", get_order)
+        db = TransactionSession()
+
+        assert await OrderService(db).create_order(103, "Main St 1", "+100") == 50
+        assert db.commits == 1
+        assert created["order"]["total_amount"] == 9.0
+        assert {(i["product_id"], i["quantity"]) for i in created["items"]} == {(1, 2), (2, 1)}
+        assert await store.get(103) == {}
+
+        with pytest.raises(ValueError, match="Cart is empty"):
+            await OrderService(db).create_order(103, "Main St 1", "+100")
+
+    @pytest.mark.asyncio
+    async def test_product_change_reaches_cached_cart(self, catalog, monkeypatch):
+        """Test that a product price change shows up in a cart that was cached"""
+        shared_cache = TieredCache("cart", maxsize=10, ttl=60)
+        monkeypatch.setattr(cart_module, "cart_cache", shared_cache)
+        monkeypatch.setattr(product_module, "cart_cache", shared_cache)
+
+        async def update(db, *, db_obj, obj_in):
+            db_obj.price = obj_in.price
+            return db_obj
+
+        monkeypatch.setattr(product, "update", update)
+        store = InMemoryCartStore()
+        await store.set(104, product_id=1, quantity=2)
+        service = StoredCartService(None, store)
+
+        assert (await service.get_user_cart(104)).total_amount == 5.0
+        assert await shared_cache.get(104) is not None
+        await ProductService(None).update_product(1, ProductUpdate(price=3.0))
+
+        assert (await service.get_user_cart(104)).total_amount == 6.0
+
+    def test_cart_cache_needs_shared_tier(self):
+        """Test that without Redis the cart cache stores nothing"""
+        assert cart_module.cart_cache.redis_url is None
+        cart_module.cart_cache.local.set(1, {"user_id": 1})
+
+        assert cart_module.cart_cache.local.get(1) is None
+
+
+    def test_redis_backend_needs_url(self):
+        """Test that the redis cart backend cannot be configured without CART_REDIS_URL"""
+        with pytest.raises(ValidationError, match="CART_REDIS_URL"):
+            Settings(CART_STORAGE_BACKEND="redis", CART_REDIS_URL=None)
+
+        assert Settings(CART_STORAGE_BACKEND="redis", CART_REDIS_URL="redis://localhost/3").CART_REDIS_URL
@@ -0,0 +1,85 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app.crud import chat_message, chat_session
+from app.services.chat import ChatService, active_session_cache
+
+
+class FakeDB:
+    """Async session stand-in for services that add and commit objects"""
+
+    def __init__(self):
+        self.info = {}
+
+    def add(self, obj):
+        pass
+
+    async def flush(self):
+        pass
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+
+@pytest.fixture
+def chat_sessions(monkeypatch):
+    """Chat sessions kept in a dict instead of the database"""
+    sessions = {}
+
+    async def get(db, id):
+        return sessions.get(id)
+
+    async def get_by_user(db, *, user_id, is_active=True):
+        return next(
+            (s for s in sessions.values() if s.user_id == user_id and s.is_active == is_active), None
+        )
+
+    async def create(db, *, obj_in):
+        session = SimpleNamespace(id=len(sessions) + 1, user_id=obj_in.user_id, is_active=True)
+        sessions[session.id] = session
+        return session
+
+    async def create_message(db, *, obj_in):
+        now = datetime.utcnow()
+        return SimpleNamespace(id=1, created_at=now, updated_at=now, **obj_in)
+
+    monkeypatch.setattr(chat_session, "get", get)
+    monkeypatch.setattr(chat_session, "get_by_user", get_by_user)
+    monkeypatch.setattr(chat_session, "create", create)
+    monkeypatch.setattr(chat_message, "create", create_message)
+    return sessions
+
+
+class TestClosedChatSession:
+    """Test cases for writes racing with a session being closed"""
+
+    @pytest.mark.asyncio
+    async def test_post_after_close_opens_a_new_session(self, chat_sessions):
+        """Test that a message is never stored in a closed session, even if its id is still cached"""
+        service = ChatService(FakeDB())
+        closed_id = await service.resolve_session_id(201)
+        await service.close_session(closed_id)
+        # Another worker may still have the closed session cached
+        await active_session_cache.set(201, closed_id)
+
+        assert await service.resolve_session_id(201) == closed_id
+        message = await service.add_message(201, "hello")
+
+        assert message.session_id != closed_id
+        assert chat_sessions[message.session_id].is_active
+        await active_session_cache.delete(201)
+
+    @pytest.mark.asyncio
+    async def test_staff_cannot_post_to_closed_session(self, chat_sessions):
+        """Test that staff messages to a closed session are rejected"""
+        service = ChatService(FakeDB())
+        session_id = await service.resolve_session_id(202)
+        await service.close_session(session_id)
+
+        with pytest.raises(ValueError, match="closed"):
+            await service.add_staff_message(session_id, 1, "hello")
@@ -0,0 +1,468 @@
+import asyncio
+import json
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app.websockets.backplane import InMemoryBackplane
+from app.websockets.chat import ConnectionManager
+from app.websockets.connection import REPLACED_CLOSE_CODE, ClientConnection, SlowClientPolicy
+from app.websockets.presence import PING_FRAME, PRESENCE_PREFIX
+from app.websockets import chat, staff, writer
+from app.websockets.staff import StaffConnection
+from app.websockets.writer import ChatMessageWriter
+
+
+class FakeWebSocket:
+    """Minimal stand-in for a Starlette WebSocket"""
+
+    def __init__(self):
+        self.accepted = False
+        self.sent = []
+
+    async def accept(self):
+        self.accepted = True
+
+    async def send_text(self, message: str):
+        self.sent.append(message)
+
+    async def close(self, code: int = 1000, reason=None):
+        self.close_code = code
+
+    @property
+    def messages(self):
+        return [message for message in self.sent if not message.startswith(PRESENCE_PREFIX)]
+
+
+class StalledWebSocket(FakeWebSocket):
+    """WebSocket whose sends never complete, like a client that stopped reading"""
+
+    async def send_text(self, message: str):
+        await asyncio.Event().wait()
+
+
+class TestConnectionManager:
+    """Test cases for chat connection management"""
+
+    @pytest.mark.asyncio
+    async def test_broadcast_reaches_session_connections(self):
+        """Test that a broadcast reaches every connection of the session only"""
+        manager = ConnectionManager(InMemoryBackplane())
+        await manager.start()
+        customer, staff, other = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        connections = [
+            await manager.connect(customer, session_id=1, user_id=10),
+            await manager.connect(staff, session_id=1, user_id=20),
+            await manager.connect(other, session_id=2, user_id=30)
+        ]
+
+        await manager.broadcast("hello", session_id=1)
+        for connection in connections:
+            await connection.join()
+
+        assert customer.messages == ["hello"]
+        assert staff.messages == ["hello"]
+        assert other.messages == []
+        await manager.stop()
+
+    @pytest.mark.asyncio
+    async def test_broadcast_across_workers(self):
+        """Test that managers sharing a backplane deliver each other's frames"""
+        backplane = InMemoryBackplane()
+        first, second = ConnectionManager(backplane), ConnectionManager(backplane)
+        await first.start()
+        await second.start()
+        customer, staff = FakeWebSocket(), FakeWebSocket()
+        customer_connection = await first.connect(customer, session_id=1, user_id=10)
+        staff_connection = await second.connect(staff, session_id=1, user_id=20)
+
+        await first.broadcast("hello", session_id=1)
+        await customer_connection.join()
+        await staff_connection.join()
+
+        assert customer.messages == ["hello"]
+        assert staff.messages == ["hello"]
+        assert first.presence.online(1) == second.presence.online(1) == [10, 20]
+        await first.stop()
+        await second.stop()
+
+    @pytest.mark.asyncio
+    async def test_reconnect_replaces_previous_socket(self):
+        """Test that a customer's new socket closes the previous one with the replaced code"""
+        manager = ConnectionManager(InMemoryBackplane())
+        await manager.start()
+        old, new = FakeWebSocket(), FakeWebSocket()
+        old_connection = await manager.connect(old, session_id=1, user_id=10)
+        await manager.connect(new, session_id=1, user_id=10)
+        await old_connection._closing
+
+        assert old_connection.closed
+        assert old.close_code == REPLACED_CLOSE_CODE
+        assert manager.presence.online(1) == [10]
+        await manager.stop()
+
+    @pytest.mark.asyncio
+    async def test_same_staff_user_keeps_every_socket(self):
+        """Test that a staff user's second socket doesn't replace the first in a session"""
+        manager = ConnectionManager(InMemoryBackplane())
+        await manager.start()
+        first, second = FakeWebSocket(), FakeWebSocket()
+        multiplexed = await manager.accept(first, 20, StaffConnection)
+        await manager.join(multiplexed, 1)
+        per_session = await manager.connect(second, session_id=1, user_id=20)
+
+        frame = json.dumps({"type": "status", "session_id": 1, "content": "hello"})
+        await manager.broadcast(frame, session_id=1)
+        await multiplexed.join()
+        await per_session.join()
+
+        assert not multiplexed.closed
+        assert first.messages == [frame]
+        assert second.messages == [frame]
+        assert manager.active_connections == {1: {multiplexed, per_session}}
+
+        await manager.disconnect(per_session)
+        assert manager.active_connections == {1: {multiplexed}}
+        await manager.stop()
+
+    @pytest.mark.asyncio
+    async def test_slow_client_does_not_stall_broadcast(self):
+        """Test that a stalled client drops frames while others keep receiving"""
+        manager = ConnectionManager(InMemoryBackplane())
+        await manager.start()
+        customer, stalled = FakeWebSocket(), StalledWebSocket()
+        customer_connection = await manager.connect(customer, session_id=1, user_id=10)
+        await manager.connect(stalled, session_id=1, user_id=20)
+
+        for i in range(150):
+            await asyncio.wait_for(manager.broadcast(str(i), session_id=1), timeout=1)
+        await customer_connection.join()
+
+        assert len(customer.messages) == 150
+        stats = manager.stats()
+        assert stats["dropped_frames"] > 0
+        assert stats["max_queue_depth"] <= 100
+        await manager.stop()
+
+    @pytest.mark.asyncio
+    async def test_presence_and_idle_reaping(self):
+        """Test that joins are tracked and stalled connections are reaped"""
+        manager = ConnectionManager(InMemoryBackplane())
+        await manager.start()
+        active, idle = FakeWebSocket(), StalledWebSocket()
+        active_connection = await manager.connect(active, session_id=1, user_id=10)
+        idle_connection = await manager.connect(idle, session_id=1, user_id=20)
+        assert manager.presence.online(1) == [10, 20]
+
+        idle_connection.last_seen -= 3600
+        await manager.reap_idle()
+        await active_connection.join()
+
+        assert manager.presence.online(1) == [10]
+        assert idle_connection.closed
+        assert manager.active_connections == {1: {active_connection}}
+        assert active.messages == [PING_FRAME]
+        await manager.stop()
+
+    @pytest.mark.asyncio
+    async def test_client_that_never_pongs_is_reaped(self):
+        """Test that delivered pings don't keep a client alive that never answers them"""
+        manager = ConnectionManager(InMemoryBackplane())
+        await manager.start()
+        websocket = FakeWebSocket()
+        connection = await manager.connect(websocket, session_id=1, user_id=10)
+        await connection.join()
+
+        connection.last_seen -= 60
+        last_seen = connection.last_seen
+        await manager.reap_idle()
+        await connection.join()
+        assert websocket.messages == [PING_FRAME]
+        assert connection.last_seen == last_seen
+
+        connection.last_seen -= 3600
+        await manager.reap_idle()
+        assert connection.closed
+        assert manager.reaped_connections == 1
+        await manager.stop()
+
+    @pytest.mark.asyncio
+    async def test_delivered_frames_keep_read_only_client(self):
+        """Test that a client which never answers pings stays while frames reach it"""
+        manager = ConnectionManager(InMemoryBackplane())
+        await manager.start()
+        connection = await manager.connect(FakeWebSocket(), session_id=1, user_id=10)
+        await connection.join()
+
+        connection.last_seen -= 3600
+        await manager.broadcast("hello", session_id=1)
+        await connection.join()
+        await manager.reap_idle()
+
+        assert not connection.closed
+        await manager.stop()
+
+
+class TestClientConnection:
+    """Test cases for per-connection outbound queues"""
+
+    @pytest.mark.asyncio
+    async def test_drop_oldest_keeps_latest_frames(self):
+        """Test that the drop_oldest policy discards the oldest queued frame"""
+        connection = ClientConnection(FakeWebSocket(), queue_size=2, policy=SlowClientPolicy.DROP_OLDEST)
+
+        assert connection.send("a")
+        assert connection.send("b")
+        assert not connection.send("c")
+
+        assert [connection.queue.get_nowait() for _ in range(2)] == ["b", "c"]
+        assert connection.dropped == 1
+
+    @pytest.mark.asyncio
+    async def test_disconnect_policy_closes_slow_client(self):
+        """Test that the disconnect policy closes a client whose queue is full"""
+        websocket = FakeWebSocket()
+        connection = ClientConnection(websocket, queue_size=1, policy=SlowClientPolicy.DISCONNECT)
+
+        assert connection.send("a")
+        assert not connection.send("b")
+        await asyncio.sleep(0)
+
+        assert connection.closed
+        assert websocket.close_code == 1013
+
+    @pytest.mark.asyncio
+    async def test_held_frames_are_queued_on_flush(self):
+        """Test that frames sent while holding are set aside until flushed"""
+        connection = ClientConnection(FakeWebSocket(), queue_size=10, policy=SlowClientPolicy.DROP_OLDEST)
+        connection.hold()
+
+        assert connection.send("live")
+        assert connection.send("duplicate")
+        assert connection.queue.empty()
+        await connection.flush_held(lambda frame: frame != "duplicate")
+
+        connection.send("next")
+        assert [connection.queue.get_nowait() for _ in range(2)] == ["live", "next"]
+
+    @pytest.mark.asyncio
+    async def test_replay_longer_than_queue(self, monkeypatch):
+        """Test that a resume replays more messages than the send queue holds without dropping any"""
+        now = datetime.utcnow()
+        missed = [
+            (SimpleNamespace(id=i, session_id=1, content=f"missed {i}", sender_id=10, created_at=now), "a@b.c")
+            for i in range(20)
+        ]
+
+        async def get_missed(db, *, session_id, after, limit):
+            return missed
+
+        monkeypatch.setattr(chat, "async_session", FakeSession)
+        monkeypatch.setattr(chat.chat_message, "get_missed", get_missed)
+        websocket = FakeWebSocket()
+        connection = ClientConnection(websocket, queue_size=5, policy=SlowClientPolicy.DISCONNECT)
+        connection.start()
+        connection.hold()
+        connection.send(chat.message_frame(missed[-1][0], "a@b.c"))
+        live = json.dumps({"type": "typing", "session_id": 1, "user_id": 20})
+        connection.send(live)
+
+        await chat.replay_missed(connection, 1, resume="cursor")
+        await connection.join()
+
+        frames = [json.loads(frame) for frame in websocket.sent]
+        assert not connection.closed
+        assert [frame["content"] for frame in frames[:20]] == [f"missed {i}" for i in range(20)]
+        assert frames[20]["type"] == "resumed" and frames[20]["count"] == 20
+        assert frames[21:] == [json.loads(live)]
+
+
+class TestStaffConnection:
+    """Test cases for the staff multiplex socket"""
+
+    @pytest.mark.asyncio
+    async def test_frames_from_many_sessions_with_unread_counts(self):
+        """Test that one staff socket receives tagged frames and unread counters"""
+        manager = ConnectionManager(InMemoryBackplane())
+        await manager.start()
+        websocket = FakeWebSocket()
+        connection = await manager.accept(websocket, 20, StaffConnection)
+        manager.register(connection, session_id=1)
+        manager.register(connection, session_id=2)
+
+        customer_frame = {"type": "message", "session_id": 2, "content": "hi", "sender_id": 10}
+        own_frame = {"type": "message", "session_id": 1, "content": "hello", "sender_id": 20}
+        await manager.broadcast(json.dumps(customer_frame), session_id=2)
+        await manager.broadcast(json.dumps(own_frame), session_id=1)
+        await connection.join()
+
+        assert [json.loads(frame) for frame in websocket.sent] == [
+            customer_frame,
+            {"type": "unread", "session_id": 2, "count": 1},
+            own_frame
+        ]
+        await manager.stop()
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("data", [
+        {"action": "message", "session_id": 1},
+        {"action": "message", "session_id": 1, "content": 123},
+        {"action": "message", "session_id": 1, "content": "x" * 5000},
+        {"action": "read"},
+        {"action": "shout", "session_id": 1},
+        ["message"]
+    ])
+    async def test_invalid_actions_are_rejected(self, data, monkeypatch):
+        """Test that malformed staff actions raise ValueError before anything is stored"""
+        submitted = []
+
+        async def submit(*args):
+            submitted.append(args)
+
+        monkeypatch.setattr(staff.chat_writer, "submit", submit)
+        connection = StaffConnection(FakeWebSocket(), queue_size=10, policy=SlowClientPolicy.DROP_OLDEST, user_id=20)
+        connection.sessions.add(1)
+
+        with pytest.raises(ValueError):
+            await staff.handle_action(None, connection, "staff@example.com", data)
+        assert submitted == []
+
+
+class FakeSession:
+    """Async session stand-in that only records commits and rollbacks"""
+
+    def __init__(self):
+        self.info = {}
+        self.commits = 0
+        self.rollbacks = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def commit(self):
+        self.commits += 1
+
+    async def rollback(self):
+        self.rollbacks += 1
+
+
+class TestChatMessageWriter:
+    """Test cases for write-behind chat persistence"""
+
+    closed_sessions = set()
+
+    @pytest.fixture(autouse=True)
+    def active_sessions(self, monkeypatch):
+        """Every session is active unless its id is in closed_sessions"""
+        async def get_active(db, *, ids=None):
+            return [SimpleNamespace(id=i) for i in ids if i not in self.closed_sessions]
+
+        monkeypatch.setattr(writer.chat_session, "get_active", get_active)
+
+    @pytest.mark.asyncio
+    async def test_messages_are_stored_in_batches(self, monkeypatch):
+        """Test that buffered messages are inserted together and acked in order"""
+        batches = []
+
+        async def create_many(db, *, objs_in):
+            batches.append(objs_in)
+            now = datetime.utcnow()
+            return [
+                SimpleNamespace(id=len(batches) * 100 + i, created_at=now, updated_at=now, **values)
+                for i, values in enumerate(objs_in)
+            ]
+
+        monkeypatch.setattr(writer, "async_session", FakeSession)
+        monkeypatch.setattr(writer.chat_message, "create_many", create_many)
+        chat_writer = ChatMessageWriter(batch_size=3, flush_interval=60, max_buffer=10)
+        await chat_writer.start()
+
+        futures = [await chat_writer.submit(1, 10, f"message {i}") for i in range(4)]
+        stored = await asyncio.wait_for(asyncio.gather(*futures[:3]), timeout=1)
+        await chat_writer.stop()
+
+        assert [len(batch) for batch in batches] == [3, 1]
+        assert [message.id for message in stored] == [100, 101, 102]
+        assert futures[3].result().content == "message 3"
+
+    @pytest.mark.asyncio
+    async def test_stop_waits_for_flush_in_progress(self, monkeypatch):
+        """Test that stopping during a flush lets it finish instead of losing the batch"""
+        started, release = asyncio.Event(), asyncio.Event()
+
+        async def create_many(db, *, objs_in):
+            started.set()
+            await release.wait()
+            now = datetime.utcnow()
+            return [
+                SimpleNamespace(id=i, created_at=now, updated_at=now, **values)
+                for i, values in enumerate(objs_in)
+            ]
+
+        monkeypatch.setattr(writer, "async_session", FakeSession)
+        monkeypatch.setattr(writer.chat_message, "create_many", create_many)
+        chat_writer = ChatMessageWriter(batch_size=1, flush_interval=60, max_buffer=10)
+        await chat_writer.start()
+
+        future = await chat_writer.submit(1, 10, "last words")
+        await asyncio.wait_for(started.wait(), timeout=1)
+        stopping = asyncio.create_task(chat_writer.stop())
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.wait_for(stopping, timeout=1)
+
+        assert future.result().content == "last words"
+
+    @pytest.mark.asyncio
+    async def test_message_to_closed_session_is_rejected(self, monkeypatch):
+        """Test that a message accepted before its session was closed is not stored"""
+        stored = []
+
+        async def create_many(db, *, objs_in):
+            stored.extend(objs_in)
+            now = datetime.utcnow()
+            return [SimpleNamespace(id=i, created_at=now, updated_at=now, **v) for i, v in enumerate(objs_in)]
+
+        monkeypatch.setattr(writer, "async_session", FakeSession)
+        monkeypatch.setattr(writer.chat_message, "create_many", create_many)
+        monkeypatch.setattr(self, "closed_sessions", {2})
+        chat_writer = ChatMessageWriter(batch_size=10, flush_interval=60, max_buffer=10)
+
+        open_future = await chat_writer.submit(1, 10, "hello")
+        closed_future = await chat_writer.submit(2, 11, "too late")
+        await chat_writer.flush()
+
+        assert open_future.result().content == "hello"
+        with pytest.raises(ValueError, match="closed"):
+            closed_future.result()
+        assert [values["session_id"] for values in stored] == [1]
+
+    @pytest.mark.asyncio
+    async def test_bad_row_only_fails_its_own_message(self, monkeypatch):
+        """Test that a failing batch is retried row by row so the other messages are stored"""
+        inserts = []
+
+        async def create_many(db, *, objs_in):
+            inserts.append(len(objs_in))
+            if any(values["content"] == "bad" for values in objs_in):
+                raise RuntimeError("violates foreign key constraint")
+            now = datetime.utcnow()
+            return [SimpleNamespace(id=i, created_at=now, updated_at=now, **v) for i, v in enumerate(objs_in)]
+
+        monkeypatch.setattr(writer, "async_session", FakeSession)
+        monkeypatch.setattr(writer.chat_message, "create_many", create_many)
+        chat_writer = ChatMessageWriter(batch_size=10, flush_interval=60, max_buffer=10)
+
+        futures = [await chat_writer.submit(1, 10, content) for content in ("first", "bad", "last")]
+        await chat_writer.flush()
+
+        assert inserts == [3, 1, 1, 1]
+        assert futures[0].result().content == "first"
+        assert futures[2].result().content == "last"
+        with pytest.raises(RuntimeError):
+            futures[1].result()
+
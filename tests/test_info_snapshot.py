@@ -0,0 +1,69 @@
+import json
+
+from starlette.requests import Request
+
+from app.api.v1.endpoints.info import snapshot_response
+from app.services.info import InfoSnapshot
+
+
+def make_request(headers: dict) -> Request:
+    raw_headers = [(k.lower().encode(), v.encode()) for k, v in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw_headers})
+
+
+class TestInfoSnapshot:
+    """Test cases for the pre-rendered info snapshot"""
+
+    def test_update_renders_documents(self):
+        """Test that documents are rendered to JSON bytes with an ETag"""
+        snapshot = InfoSnapshot(ttl=60)
+        snapshot.update({"static": {"company_name": "Coffee"}})
+
+        body, etag = snapshot.documents["static"]
+        assert json.loads(body) == {"company_name": "Coffee"}
+        assert etag.startswith('"') and etag.endswith('"')
+        assert snapshot.is_fresh()
+
+    def test_invalidate(self):
+        """Test that an invalidated snapshot is stale"""
+        snapshot = InfoSnapshot(ttl=60)
+        snapshot.update({"static": {}})
+        snapshot.invalidate()
+
+        assert not snapshot.is_fresh()
+
+    def test_invalidate_during_rebuild(self):
+        """Test that a rebuild which raced with an invalidation is not marked fresh"""
+        snapshot = InfoSnapshot(ttl=60)
+        version = snapshot.version
+        snapshot.invalidate()
+        snapshot.update({"static": {"a": "old"}}, version=version)
+
+        assert not snapshot.is_fresh()
+
+        snapshot.update({"static": {"a": "new"}}, version=snapshot.version)
+        assert snapshot.is_fresh()
+
+    def test_etag_is_content_based(self):
+        """Test that the same content gets the same ETag across rebuilds"""
+        first = InfoSnapshot(ttl=60)
+        second = InfoSnapshot(ttl=60)
+        first.update({"static": {"a": "b"}})
+        second.update({"static": {"a": "b"}})
+
+        assert first.documents["static"][1] == second.documents["static"][1]
+
+    def test_not_modified(self):
+        """Test that a matching If-None-Match returns 304 without a body"""
+        snapshot = InfoSnapshot(ttl=60)
+        snapshot.update({"static": {"a": "b"}})
+        body, etag = snapshot.documents["static"]
+
+        response = snapshot_response(make_request({"If-None-Match": etag}), (body, etag))
+        assert response.status_code == 304
+        assert response.body == b""
+
+        response = snapshot_response(make_request({}), (body, etag))
+        assert response.status_code == 200
+        assert response.body == body
+        assert response.headers["etag"] == etag
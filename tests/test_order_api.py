@@ -99,11 +99,12 @@ class TestOrderAPI:
 
         assert response.status_code == 200
         data = response.json()
-        assert isinstance(data, list)
-        assert len(data) >= 1
+        assert isinstance(data["items"], list)
+        assert len(data["items"]) >= 1
+        assert "next_cursor" in data
 
         # Verify first order in list
-        order = next((o for o in data if o["id"] == test_order.id), None)
+        order = next((o for o in data["items"] if o["id"] == test_order.id), None)
         assert order is not None
         assert order["status"] == test_order.status
         assert order["total_amount"] == test_order.total_amount
@@ -0,0 +1,33 @@
+from datetime import datetime
+
+import pytest
+
+from app.crud.base import decode_cursor, encode_cursor
+from app.db.models.order import Order
+
+
+class TestCursor:
+    """Test cases for keyset pagination cursors"""
+
+    def test_round_trip(self):
+        """Test that a cursor decodes to the values it was built from"""
+        created_at = datetime(2024, 5, 1, 12, 30, 15, 123456)
+        cursor = encode_cursor([created_at, 42])
+
+        values = decode_cursor(cursor, [Order.created_at, Order.id])
+
+        assert values == [created_at, 42]
+
+    def test_cursor_is_opaque(self):
+        """Test that a cursor is a URL-safe token"""
+        cursor = encode_cursor([datetime(2024, 5, 1), 7])
+
+        assert "=" not in cursor
+        assert "/" not in cursor
+        assert "+" not in cursor
+
+    @pytest.mark.parametrize("cursor", ["not-a-cursor", encode_cursor([1]), encode_cursor(["x", "y"])])
+    def test_invalid_cursor(self, cursor: str):
+        """Test that malformed cursors are rejected"""
+        with pytest.raises(ValueError):
+            decode_cursor(cursor, [Order.created_at, Order.id])
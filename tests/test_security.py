@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+from jose import JWTError
+
+from app.core.security import PasswordHasher, create_access_token, decode_token, token_cache
+
+
+class TestPasswordHasher:
+    """Test cases for the off-loop password hasher"""
+
+    @pytest.mark.asyncio
+    async def test_hash_and_verify(self):
+        """Test that a hashed password verifies and a wrong one doesn't"""
+        hasher = PasswordHasher(concurrency=2)
+        try:
+            hashed = await hasher.hash("Password123")
+
+            assert await hasher.verify("Password123", hashed) is True
+            assert await hasher.verify("Wrong123", hashed) is False
+        finally:
+            hasher.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_concurrency_is_bounded(self):
+        """Test that excess operations queue instead of running at once"""
+        hasher = PasswordHasher(concurrency=1)
+        try:
+            results = await asyncio.gather(*[hasher.hash("Password123") for _ in range(3)])
+
+            assert len(results) == 3
+            assert hasher.max_queue_depth >= 2
+            assert hasher.stats()["in_flight"] == 0
+            assert hasher.stats()["queue_depth"] == 0
+        finally:
+            hasher.shutdown()
+
+
+class TestDecodeTokenCache:
+    """Test cases for the verified token cache"""
+
+    def test_repeated_decode_hits_cache(self):
+        """Test that decoding the same token twice is served from the cache"""
+        token_cache.clear()
+        token = create_access_token("42")
+
+        first = decode_token(token)
+        hits = token_cache.hits
+        second = decode_token(token)
+
+        assert first == second
+        assert first["sub"] == "42"
+        assert token_cache.hits == hits + 1
+
+    def test_invalid_token_is_not_cached(self):
+        """Test that tokens failing verification are rejected every time"""
+        token_cache.clear()
+        token = create_access_token("42") + "x"
+
+        for _ in range(2):
+            with pytest.raises(JWTError):
+                decode_token(token)
+        assert len(token_cache) == 0
@@ -0,0 +1,81 @@
+import pytest
+
+from app.crud.base import UnitOfWork, save_changes
+
+
+class RecordingSession:
+    """Async session stand-in that records flushes, commits and rollbacks"""
+
+    def __init__(self):
+        self.info = {}
+        self.calls = []
+
+    async def flush(self):
+        self.calls.append("flush")
+
+    async def commit(self):
+        self.calls.append("commit")
+
+    async def rollback(self):
+        self.calls.append("rollback")
+
+
+class TestUnitOfWork:
+    """Test cases for the transaction-scoped unit of work"""
+
+    @pytest.mark.asyncio
+    async def test_writes_commit_once(self):
+        """Test that writes only flush inside a unit of work, which commits on exit"""
+        db = RecordingSession()
+        await save_changes(db)
+        assert db.calls == ["commit"]
+
+        db.calls.clear()
+        async with UnitOfWork(db):
+            await save_changes(db)
+            async with UnitOfWork(db):
+                await save_changes(db)
+        assert db.calls == ["flush", "flush", "commit"]
+        assert db.info == {}
+
+    @pytest.mark.asyncio
+    async def test_rolls_back_on_error(self):
+        """Test that an error inside a unit of work rolls everything back"""
+        db = RecordingSession()
+        with pytest.raises(ValueError):
+            async with UnitOfWork(db):
+                await save_changes(db)
+                raise ValueError("Product not found")
+        assert db.calls == ["flush", "rollback"]
+        assert db.info == {}
+
+    @pytest.mark.asyncio
+    async def test_service_writes_roll_back_with_the_block(self, monkeypatch):
+        """Test that cart and chat writes inside a unit of work are undone when the block raises"""
+        from types import SimpleNamespace
+
+        from app.services import cart as cart_service
+        from app.services import chat as chat_service
+
+        async def get_by_user(db, user_id):
+            return SimpleNamespace(id=1, user_id=user_id)
+
+        async def remove_by_cart(db, cart_id):
+            return None
+
+        async def get_session(db, id):
+            return SimpleNamespace(id=id, user_id=7, is_active=True)
+
+        monkeypatch.setattr(cart_service.cart, "get_by_user", get_by_user)
+        monkeypatch.setattr(cart_service.cart_item, "remove_by_cart", remove_by_cart)
+        monkeypatch.setattr(chat_service.chat_session, "get", get_session)
+
+        db = RecordingSession()
+        db.add = lambda obj: None
+        with pytest.raises(ValueError):
+            async with UnitOfWork(db):
+                await cart_service.CartService(db).clear_cart(7)
+                await chat_service.ChatService(db).close_session(3)
+                raise ValueError("Payment failed")
+        assert db.calls == ["flush", "flush", "rollback"]
+        assert db.info == {}